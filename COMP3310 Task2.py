@@ -1,8 +1,14 @@
 import socket
 import time
 
+from gopher_probe import probe_endpoints
+from gopher_recv import SizeCounter, TransferLimit, recv_all, recv_stream, wait_for_data
+from gopher_resolve import Resolver, canonical_host
+from gopher_visited import CompactSet
+from gopher_resilience import ServerHealthTracker
+
 # GLOBAL VARIABLES
-visited_selectors = set()
+visited_selectors = CompactSet()  # 64-bit fingerprints, not full tuples
 directories = []
 text_files = []
 binary_files = []
@@ -12,39 +18,90 @@ smallest_text = {"path": "", "content": "", "size": float("inf")}
 largest_text_size = 0
 smallest_binary_size = float("inf")
 largest_binary_size = 0
-
-def send_gopher_request(host, port, selector):
-    """Send a gopher request to the specified server."""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(5)  # 5 seconds timeout
-            s.connect((host, port))
-            timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime())
-            request_line = selector + "\r\n"
-            print(f"{timestamp} Sending request: {selector}")
-            s.sendall(request_line.encode())
-            response = b""
-            while True:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                response += chunk
-            return response
-    except Exception as e:
-        print(f"Connection failed to {host}:{port} for selector '{selector}' - {e}")
-        return None
+server_health = ServerHealthTracker(timeout=5)
+resolver = Resolver()  # each server is looked up once, not once per request
+# (max bytes, max seconds) for one response by item type; past either the
+# transfer is cut short, so a hostile server can't stall the crawl
+TRANSFER_CAPS = {'1': (16 * 1024 * 1024, 300), '0': (64 * 1024 * 1024, 300), '*': (None, 300)}
+
+def send_gopher_request(host, port, selector, make_consumer=None, item_type='1'):
+    """Send a gopher request to the specified server.
+
+    Returns (response, truncated): the response bytes, or the byte count
+    if the response was streamed into a consumer from make_consumer, and
+    why it was cut short if it went over the item type's TRANSFER_CAPS
+    (otherwise None). The response is None if the request failed.
+    Transient failures are retried, and servers that keep failing are
+    skipped for a while.
+    """
+    server = (host, port)
+    attempt = 0
+    while True:
+        if not server_health.allow(server):
+            print(f"Skipping {host}:{port} for selector '{selector}' - circuit open")
+            return None, None
+        try:
+            address = resolver.resolve(host, port)[0]
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(server_health.timeout_for(server) if attempt == 0 else 5)
+                start = time.perf_counter()
+                s.connect(address)
+                connect = time.perf_counter() - start
+                timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime())
+                request_line = selector + "\r\n"
+                print(f"{timestamp} Sending request: {selector}")
+                s.sendall(request_line.encode())
+                start = time.perf_counter()
+                wait_for_data(s)
+                ttfb = time.perf_counter() - start
+                limit = TransferLimit(*TRANSFER_CAPS.get(item_type, TRANSFER_CAPS['*']))
+                if make_consumer is not None:
+                    response = recv_stream(s, make_consumer(), limit=limit)
+                else:
+                    response = recv_all(s, limit=limit)
+                if limit.truncated:
+                    print(f"Truncated {host}:{port} selector '{selector}' - {limit.truncated}")
+                # Only a server that answered counts as healthy
+                server_health.success(server, connect + ttfb)
+                return response, limit.truncated
+        except Exception as e:
+            print(f"Connection failed to {host}:{port} for selector '{selector}' - {e}")
+            if not server_health.should_retry(server, e, attempt):
+                server_health.failure(server)
+                return None, None
+            time.sleep(server_health.retry_delay(attempt))
+            attempt += 1
+
+def record_truncated(host, port, selector, truncated, received):
+    """A cut-short response counts as an error, and its size is never used."""
+    errors.append((host, port, selector, f"truncated ({truncated}), {received} bytes received"))
 
 def crawl(host, port, selector=""):
+    # A stack of menus part way through, instead of recursing into each
+    # submenu, so deep trees can't hit the recursion limit. The order of
+    # requests is unchanged.
+    stack = [crawl_menu(host, port, selector)]
+    while stack:
+        submenu = next(stack[-1], None)
+        if submenu is None:
+            stack.pop()
+        else:
+            stack.append(crawl_menu(*submenu))
+
+def crawl_menu(host, port, selector):
+    """Process one menu, yielding each local submenu to be crawled in turn."""
     global largest_text_size, smallest_binary_size, largest_binary_size
 
-    if (host, port, selector) in visited_selectors:
+    if not visited_selectors.add('1', selector, host, port):
         return
-    visited_selectors.add((host, port, selector))
 
-    response = send_gopher_request(host, port, selector)
+    response, truncated = send_gopher_request(host, port, selector)
     if response is None:
         errors.append((host, port, selector))
         return
+    if truncated:
+        # The items that did arrive are still crawled
+        record_truncated(host, port, selector, truncated, len(response))
 
     try:
         lines = response.split(b'\r\n')
@@ -68,21 +125,25 @@ def crawl(host, port, selector=""):
                 continue
 
             item_port = int(item_port)
+            # "LOCALHOST" and "localhost." are the server being crawled too
+            item_host = canonical_host(item_host)
 
             if item_type == "1":  # Directory
                 directories.append(item_selector)
                 if item_host == host and item_port == port:
-                    crawl(host, port, item_selector)
+                    yield host, port, item_selector
                 else:
-                    key = (item_host, item_port)
-                    if key not in external_servers:
-                        test_response = send_gopher_request(item_host, item_port, "")
-                        external_servers[key] = (test_response is not None)
+                    # Checked together by probe_external_servers() after the crawl
+                    external_servers.setdefault((item_host, item_port), False)
             elif item_type == "0":  # Text file
-                file_response = send_gopher_request(item_host, item_port, item_selector)
+                file_response, truncated = send_gopher_request(item_host, item_port,
+                                                               item_selector, item_type='0')
                 if file_response:
                     size = len(file_response)
                     text_files.append(item_selector)
+                    if truncated:
+                        record_truncated(item_host, item_port, item_selector, truncated, size)
+                        continue
                     if size < smallest_text["size"]:
                         smallest_text["path"] = item_selector
                         smallest_text["content"] = file_response.decode('utf-8', errors='replace')
@@ -90,10 +151,14 @@ def crawl(host, port, selector=""):
                     if size > largest_text_size:
                         largest_text_size = size
             elif item_type == "9":  # Binary file
-                file_response = send_gopher_request(item_host, item_port, item_selector)
-                if file_response:
-                    size = len(file_response)
+                # Only the size is needed, so don't buffer the file
+                size, truncated = send_gopher_request(item_host, item_port, item_selector,
+                                                      SizeCounter, item_type='9')
+                if size:
                     binary_files.append(item_selector)
+                    if truncated:
+                        record_truncated(item_host, item_port, item_selector, truncated, size)
+                        continue
                     if size < smallest_binary_size:
                         smallest_binary_size = size
                     if size > largest_binary_size:
@@ -107,6 +172,10 @@ def crawl(host, port, selector=""):
         print(f"Failed to process response for selector '{selector}': {e}")
         errors.append((host, port, selector))
 
+def probe_external_servers(deadline=5):
+    """Check every external server at once instead of one timeout each."""
+    external_servers.update(probe_endpoints(external_servers, deadline, resolver=resolver))
+
 def main():
     # Get user input for server host and port
     server_host = input("Enter the Gopher server host: ").strip()
@@ -117,7 +186,8 @@ def main():
         print("Invalid port number. Please enter a valid integer.")
         return
 
-    crawl(server_host, server_port)
+    crawl(canonical_host(server_host), server_port)
+    probe_external_servers()
 
     print("\n--- Summary ---")
     print(f"Number of Gopher directories: {len(directories)}\n")
@@ -152,5 +222,11 @@ def main():
         status = "UP" if is_up else "DOWN"
         print(f" - {host}:{port} -> {status}")
 
+    unhealthy = server_health.report()
+    if unhealthy:
+        print("\nServer health (retries and circuit breakers):")
+        for line in unhealthy:
+            print(f" - {line}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Crawl benchmark against the local synthetic Gopher server.
+
+The server runs in its own process, and every crawl runs in a fresh child
+process, so peak RSS belongs to that crawl alone. Request and byte counts
+come from the server itself, so the GopherCrawler engines and the
+function-based crawler in "COMP3310 Task2.py" are measured the same way.
+
+    python3 gopher_bench.py --width 8 --depth 3 --binary-size 2000000
+    python3 gopher_bench.py --output new.json --compare old.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+from gopher_testserver import spec_arguments, spec_from_args
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TARGETS = ["recursive", "async", "threads", "processes", "task2"]
+
+
+def server_command(host, port, selector):
+    with socket.create_connection((host, port), timeout=5) as s:
+        s.sendall((selector + "\r\n").encode())
+        data = b""
+        while True:
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    return data
+
+
+def run_target(target, host, port, concurrency):
+    """Crawl once in this process; returns the wall time in seconds."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        if target == "task2":
+            spec = importlib.util.spec_from_file_location(
+                "task2", os.path.join(HERE, "COMP3310 Task2.py"))
+            task2 = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(task2)
+            task2.crawl(host, port)
+        else:
+            from untitled0 import GopherCrawler
+            crawler = GopherCrawler(host, port, concurrency=concurrency)
+            crawler.crawl(engine=target)
+        return time.perf_counter() - start
+
+
+def run_child(args):
+    wall = run_target(args.child, args.host, args.port, args.concurrency)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS; the processes
+    # engine's shards are children, so count the largest of them too
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == "darwin":
+        peak //= 1024
+    print(json.dumps({"wall_s": wall, "peak_rss_kb": peak}))
+
+
+def start_server(args):
+    cmd = [sys.executable, os.path.join(HERE, "gopher_testserver.py"), "--port", "0"]
+    for name, value in asdict(spec_from_args(args)).items():
+        cmd += ["--" + name.replace("_", "-"), str(value)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    port = int(line.rsplit(":", 1)[1])
+    return proc, port
+
+
+def benchmark(args):
+    server, port = start_server(args)
+    host = "127.0.0.1"
+    results = []
+    try:
+        for target in args.targets:
+            for run in range(args.repeat):
+                server_command(host, port, "/__reset__")
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", target,
+                     "--host", host, "--port", str(port),
+                     "--concurrency", str(args.concurrency)],
+                    capture_output=True, text=True, cwd=HERE, timeout=args.timeout)
+                if child.returncode != 0:
+                    print(f"{target}: failed\n{child.stderr}", file=sys.stderr)
+                    results.append({"target": target, "run": run, "failed": True})
+                    continue
+                measured = json.loads(child.stdout.strip().splitlines()[-1])
+                served = json.loads(server_command(host, port, "/__stats__"))
+                wall = measured["wall_s"]
+                result = {
+                    "target": target,
+                    "run": run,
+                    "wall_s": round(wall, 4),
+                    "items": served["requests"],
+                    "bytes": served["bytes"],
+                    "items_per_s": round(served["requests"] / wall, 1),
+                    "bytes_per_s": round(served["bytes"] / wall, 1),
+                    "peak_rss_kb": measured["peak_rss_kb"],
+                }
+                results.append(result)
+                print(f"{target:>10}: {result['wall_s']:8.3f}s  {result['items']:6d} items "
+                      f"({result['items_per_s']:9.1f}/s)  {result['bytes_per_s'] / 1e6:8.2f} MB/s  "
+                      f"peak RSS {result['peak_rss_kb'] / 1024:.1f} MB")
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "spec": asdict(spec_from_args(args)),
+        "concurrency": args.concurrency,
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def best_runs(report):
+    """Fastest successful run per target."""
+    best = {}
+    for r in report["results"]:
+        if not r.get("failed") and (r["target"] not in best or r["wall_s"] < best[r["target"]]["wall_s"]):
+            best[r["target"]] = r
+    return best
+
+
+def compare(old, new):
+    print("\nChange vs baseline (items/s, peak RSS):")
+    if old["spec"] != new["spec"]:
+        print("  (warning: the baseline crawled a different tree)")
+    old_best, new_best = best_runs(old), best_runs(new)
+    for target, r in new_best.items():
+        if target not in old_best:
+            continue
+        o = old_best[target]
+        speed = (r["items_per_s"] / o["items_per_s"] - 1) * 100
+        rss = (r["peak_rss_kb"] / o["peak_rss_kb"] - 1) * 100
+        print(f"{target:>10}: {speed:+7.1f}% throughput, {rss:+7.1f}% peak RSS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Gopher crawlers on a synthetic tree.")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="seconds before a crawl is abandoned")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    parser.add_argument("--child", choices=TARGETS, help=argparse.SUPPRESS)
+    parser.add_argument("--host", default="127.0.0.1", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    spec_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    report = benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
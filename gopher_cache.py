@@ -0,0 +1,231 @@
+"""
+Local content-addressed cache of Gopher responses.
+
+Bodies are stored once per digest under the cache directory, however many
+(host, port, selector) keys point at them. Blobs are evicted least recently
+used first once the total size passes max_bytes. The index is saved to
+index.json on close so the cache carries over between runs.
+
+Menus change as a server's content does, so a cached menu is only reused
+for menu_ttl seconds (an hour by default) before it is fetched again; the
+files a menu lists are reused until the overall ttl, if any, runs out.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from gopher_records import content_digest
+from gopher_recv import DigestCounter
+
+MENU_TTL = 3600
+
+
+class CachedBlob:
+    """Stands in for a binary fetch's DigestCounter on a cache hit."""
+
+    def __init__(self, size, digest):
+        self.size = size
+        self.digest = digest
+
+    def __len__(self):
+        return self.size
+
+    def hexdigest(self):
+        return self.digest
+
+
+class CacheWriter(DigestCounter):
+    """Consumer that streams a response into a temporary file in the cache."""
+
+    def __init__(self, directory):
+        super().__init__()
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+
+    def feed(self, chunk):
+        super().feed(chunk)
+        self.file.write(chunk)
+
+    def discard(self):
+        self.file.close()
+        os.unlink(self.path)
+
+
+class ResponseCache:
+    """
+    Args:
+        directory (str): Where blobs and the index are kept
+        max_bytes (int): Total blob size before eviction starts
+        ttl (float): Seconds any response is reused; None for no limit
+        menu_ttl (float): Seconds a menu is reused; None to reuse menus
+            as long as other responses
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=None, menu_ttl=MENU_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.menu_ttl = menu_ttl
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # (host, port, selector) -> (digest, stored_at)
+        self.index = {}
+        self.refs = defaultdict(set)
+        # digest -> size, least recently used first
+        self.blobs = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.deduplicated = 0
+        self.load()
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def load(self):
+        try:
+            with open(os.path.join(self.directory, 'index.json')) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for digest, size in saved['blobs']:
+            if os.path.exists(self.blob_path(digest)):
+                self.blobs[digest] = size
+                self.total += size
+        for host, port, selector, digest, stored_at in saved['index']:
+            if digest in self.blobs:
+                self.index[(host, port, selector)] = (digest, stored_at)
+                self.refs[digest].add((host, port, selector))
+
+    def save(self):
+        with self.lock:
+            saved = {
+                'blobs': list(self.blobs.items()),
+                'index': [[*key, digest, stored_at] for key, (digest, stored_at) in self.index.items()],
+            }
+        path = os.path.join(self.directory, 'index.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(saved, f)
+        os.replace(path + '.tmp', path)
+
+    def max_age(self, item_type):
+        """Seconds a cached response of item_type may be reused, or None for no limit."""
+        ages = [self.ttl, self.menu_ttl if item_type == '1' else None]
+        ages = [age for age in ages if age is not None]
+        return min(ages) if ages else None
+
+    def lookup(self, key, max_age):
+        """Digest and size for key if it is cached and fresh; counts the hit or miss."""
+        entry = self.index.get(key)
+        if entry is not None:
+            digest, stored_at = entry
+            if max_age is None or time.time() - stored_at <= max_age:
+                self.blobs.move_to_end(digest)
+                self.hits += 1
+                return digest, self.blobs[digest]
+        self.misses += 1
+        return None
+
+    def get(self, host, port, selector, item_type=None):
+        """Returns the cached response bytes, or None on a miss."""
+        with self.lock:
+            found = self.lookup((host, port, selector), self.max_age(item_type))
+        if found is None:
+            return None
+        try:
+            # Read outside the lock, so another thread may evict it meanwhile
+            with open(self.blob_path(found[0]), 'rb') as f:
+                return f.read()
+        except OSError:
+            with self.lock:
+                self.hits -= 1
+                self.misses += 1
+                if not os.path.exists(self.blob_path(found[0])):
+                    self.forget(found[0])
+            return None
+
+    def get_blob(self, host, port, selector, item_type=None):
+        """Like get, but only returns the size and digest (as a CachedBlob)."""
+        with self.lock:
+            found = self.lookup((host, port, selector), self.max_age(item_type))
+        return CachedBlob(found[1], found[0]) if found is not None else None
+
+    def put(self, host, port, selector, data):
+        digest = content_digest(data)
+        with self.lock:
+            if self.admit(digest, len(data)):
+                self.write_blob(digest, data)
+            self.link((host, port, selector), digest)
+
+    def writer(self):
+        return CacheWriter(self.directory)
+
+    def commit(self, writer, host, port, selector):
+        """Store what a CacheWriter received under host, port and selector."""
+        writer.file.close()
+        digest = writer.hexdigest()
+        with self.lock:
+            if self.admit(digest, writer.size):
+                os.makedirs(os.path.dirname(self.blob_path(digest)), exist_ok=True)
+                os.replace(writer.path, self.blob_path(digest))
+            else:
+                os.unlink(writer.path)
+            self.link((host, port, selector), digest)
+
+    def admit(self, digest, size):
+        """Account for a new blob; returns True if its bytes need writing."""
+        if digest in self.blobs:
+            self.deduplicated += 1
+            self.blobs.move_to_end(digest)
+            return False
+        if size > self.max_bytes:
+            return False
+        self.blobs[digest] = size
+        self.total += size
+        self.evict()
+        return True
+
+    def write_blob(self, digest, data):
+        path = self.blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+
+    def link(self, key, digest):
+        if digest not in self.blobs:
+            return
+        old = self.index.get(key)
+        if old is not None:
+            self.refs[old[0]].discard(key)
+        self.index[key] = (digest, time.time())
+        self.refs[digest].add(key)
+
+    def forget(self, digest):
+        """Drop a blob whose file has gone, and every key pointing at it."""
+        size = self.blobs.pop(digest, None)
+        if size is not None:
+            self.total -= size
+        for key in self.refs.pop(digest, ()):
+            del self.index[key]
+
+    def evict(self):
+        while self.total > self.max_bytes and self.blobs:
+            digest, size = self.blobs.popitem(last=False)
+            self.total -= size
+            self.evictions += 1
+            for key in self.refs.pop(digest, ()):
+                del self.index[key]
+            try:
+                os.unlink(self.blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def summary(self):
+        return (f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+                f"{self.deduplicated} deduplicated; {self.total} bytes in {len(self.blobs)} blobs")
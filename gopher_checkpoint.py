@@ -0,0 +1,110 @@
+"""
+Crawl checkpoints stored in a small sqlite database.
+
+Visited identifiers are appended as they are discovered, so each save only
+writes what is new since the last one. The pending frontier and the
+aggregated stats are small enough to replace wholesale on every save.
+"""
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        # Saves happen under the crawler's lock, so any thread may write
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS visited (id TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS frontier (job TEXT);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def reset(self):
+        """Discard any previous crawl stored in this file."""
+        with self.conn:
+            self.conn.execute("DELETE FROM visited")
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.execute("DELETE FROM state")
+
+    def save(self, new_visited, frontier, stats, complete=False):
+        """
+        Record progress in one transaction.
+
+        Args:
+            new_visited (list): Visited identifiers added since the last save
+            frontier (list): Every job queued or in flight, as tuples
+            stats (dict): JSON-serialisable crawler stats
+            complete (bool): True once the frontier has drained
+        """
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO visited VALUES (?)",
+                                  ((v,) for v in new_visited))
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.executemany("INSERT INTO frontier VALUES (?)",
+                                  ((json.dumps(job),) for job in frontier))
+            self.conn.executemany("INSERT OR REPLACE INTO state VALUES (?, ?)", [
+                ('stats', json.dumps(stats)),
+                ('complete', json.dumps(complete)),
+            ])
+
+    def load(self):
+        """
+        Returns:
+            tuple: (visited identifiers, frontier jobs, stats) or None if the
+            file holds no saved crawl
+        """
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'stats'").fetchone()
+        if row is None:
+            return None
+        stats = json.loads(row[0])
+        visited = [v for (v,) in self.conn.execute("SELECT id FROM visited")]
+        frontier = [tuple(json.loads(job)) for (job,) in self.conn.execute("SELECT job FROM frontier")]
+        return visited, frontier, stats
+
+    def close(self):
+        self.conn.close()
+
+
+class CompletionGate:
+    """
+    Lets worker threads finish jobs concurrently while giving a checkpoint
+    a moment when no job is half way through updating the crawl state.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.active = 0
+        self.saving = False
+
+    @contextmanager
+    def completing(self):
+        with self.cond:
+            while self.saving:
+                self.cond.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                if not self.active:
+                    self.cond.notify_all()
+
+    @contextmanager
+    def quiesce(self):
+        with self.cond:
+            while self.saving:
+                self.cond.wait()
+            self.saving = True
+            while self.active:
+                self.cond.wait()
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.saving = False
+                self.cond.notify_all()
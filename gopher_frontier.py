@@ -0,0 +1,109 @@
+"""
+Crawl frontier and budgets for the single-threaded engine.
+
+Frontier holds the jobs still to fetch, with their depth below the root,
+in one of three orders:
+
+- dfs: depth first, each menu's children in the order listed (the order
+  the crawler used to recurse in)
+- bfs: breadth first, level by level
+- priority: menus first, then text, then everything else, shallowest
+  first within each, so a budgeted crawl maps the tree before spending
+  its bytes on large files
+
+CrawlBudget stops a crawl after a number of items, bytes or seconds, and
+limits how deep it descends.
+"""
+
+import heapq
+import threading
+import time
+from collections import deque
+
+ORDERS = ('dfs', 'bfs', 'priority')
+TYPE_PRIORITY = {'1': 0, '0': 1}
+
+
+class Frontier:
+    def __init__(self, order='dfs'):
+        if order not in ORDERS:
+            raise ValueError(f"unknown frontier order {order!r}")
+        self.order = order
+        self.items = [] if order != 'bfs' else deque()
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def extend(self, jobs, depth):
+        """Add one menu's children, given in the order the menu lists them."""
+        if self.order == 'dfs':
+            # Reversed, so the first child is popped first
+            self.items.extend((job, depth) for job in reversed(jobs))
+        elif self.order == 'bfs':
+            self.items.extend((job, depth) for job in jobs)
+        else:
+            for job in jobs:
+                # seq keeps equal priorities first in, first out
+                self.seq += 1
+                heapq.heappush(self.items, (TYPE_PRIORITY.get(job[0], 2), depth, self.seq, job))
+
+    def pop(self):
+        """Returns (job, depth)."""
+        if self.order == 'dfs':
+            return self.items.pop()
+        if self.order == 'bfs':
+            return self.items.popleft()
+        _, depth, _, job = heapq.heappop(self.items)
+        return job, depth
+
+
+class CrawlBudget:
+    """
+    Args:
+        max_depth (int): Deepest level to fetch; the root menu is depth 0
+        max_items (int): Fetches to start
+        max_bytes (int): Bytes to download; the fetch that crosses it completes
+        max_time (float): Seconds from start() before no new fetch starts
+    """
+
+    def __init__(self, max_depth=None, max_items=None, max_bytes=None, max_time=None):
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+        self.items = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.stopped = None
+        self.lock = threading.Lock()
+
+    def __bool__(self):
+        return any(limit is not None for limit in
+                   (self.max_depth, self.max_items, self.max_bytes, self.max_time))
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def allows_depth(self, depth):
+        return self.max_depth is None or depth <= self.max_depth
+
+    def admit(self):
+        """Claim one fetch; returns False once any budget is spent."""
+        with self.lock:
+            if self.stopped is None:
+                if self.max_items is not None and self.items >= self.max_items:
+                    self.stopped = f"item budget of {self.max_items} reached"
+                elif self.max_bytes is not None and self.bytes >= self.max_bytes:
+                    self.stopped = f"byte budget of {self.max_bytes} reached"
+                elif (self.max_time is not None
+                      and time.monotonic() - self.started >= self.max_time):
+                    self.stopped = f"time budget of {self.max_time}s reached"
+            if self.stopped is not None:
+                return False
+            self.items += 1
+            return True
+
+    def spend(self, size):
+        with self.lock:
+            self.bytes += size
@@ -0,0 +1,160 @@
+"""
+Gopher menu parsing.
+
+parse_lines() turns the bytes of a menu into item tuples in one pass. The
+"." terminator is located in the raw bytes first, so nothing after it is
+decoded; everything before it is decoded in a single call straight from
+the receive buffer, through a memoryview, and then split into lines and
+fields. Only when that fails are the lines decoded one by one, so a menu
+with a few badly encoded lines keeps the rest. Lines may end in CRLF or a
+bare LF.
+
+Items are plain (item_type, description, selector, host, port) tuples, the
+lightest record Python has: a tuple subclass or __slots__ class costs
+twice as much to build, and unlike a tuple of strings and ints can't be
+untracked by the garbage collector, which then rescans every item of a
+large menu.
+
+MenuStreamParser is a receive consumer: it is fed the menu as it arrives
+from the socket and hands each item to a callback as soon as its line is
+complete, so the crawler can start fetching children while the rest of a
+large menu is still downloading.
+"""
+
+from gopher_recv import DigestCounter
+
+TERMINATORS = (b'\n.\r\n', b'\n.\n')
+
+
+def menu_end(buf, end):
+    """Offset of the "." line within buf[:end], or -1 if there is none."""
+    if buf.startswith((b'.\r\n', b'.\n'), 0, end):
+        return 0
+    found = [i + 1 for i in (buf.find(t, 0, end) for t in TERMINATORS) if i >= 0]
+    return min(found) if found else -1
+
+
+def decode_lines(buf, end):
+    """
+    Decode buf[:end] and split it into lines.
+
+    Returns:
+        tuple: (lines, number of lines dropped for invalid UTF-8)
+    """
+    with memoryview(buf) as view:
+        try:
+            return str(view[:end], 'utf-8').split('\n'), 0
+        except UnicodeDecodeError:
+            pass
+    lines = []
+    bad = 0
+    for raw in buf[:end].split(b'\n'):
+        try:
+            lines.append(raw.decode('utf-8'))
+        except UnicodeDecodeError:
+            bad += 1
+    return lines, bad
+
+
+def parse_lines(buf, host, port, items, final=True):
+    """
+    Parse the menu lines in buf, appending an item tuple for each to items.
+
+    Lines with fewer than four fields, an empty type field or a bad port
+    are skipped. Anything after the fourth field (e.g. Gopher+) is ignored.
+
+    Args:
+        buf (bytes or bytearray): Menu data, starting at a line boundary
+        host (str): Server the menu came from (default for item hosts)
+        port (int): Port the menu came from (default for item ports)
+        items (list): Receives (item_type, description, selector, host, port)
+        final (bool): Whether buf ends the menu; if not, a trailing line
+            without a newline is left unparsed
+
+    Returns:
+        tuple: (bytes consumed, whether the "." line was reached, number of
+        lines dropped for invalid UTF-8)
+    """
+    consumed = len(buf) if final else buf.rfind(b'\n') + 1
+    end = menu_end(buf, consumed)
+    finished = end >= 0
+    if not finished:
+        end = consumed
+        if final:
+            tail = buf.rfind(b'\n') + 1
+            if buf[tail:] in (b'.', b'.\r'):
+                end, finished = tail, True
+    if end == 0:
+        return consumed, finished, 0
+
+    lines, bad = decode_lines(buf, end)
+    append = items.append
+    # A line's trailing "\r" stays on its last field, which int() ignores
+    ports = {'': port, '\r': port}
+    for line in lines:
+        parts = line.split('\t', 4)
+        if len(parts) < 4 or not parts[0]:
+            continue
+        item_port = ports.get(parts[3])
+        if item_port is None:
+            try:
+                item_port = ports[parts[3]] = int(parts[3])
+            except ValueError:
+                continue
+        first = parts[0]
+        append((first[0], first[1:].strip(), parts[1], parts[2] or host, item_port))
+    return consumed, finished, bad
+
+
+class MenuStreamParser(DigestCounter):
+    """
+    Consumer that parses a menu incrementally, stopping at the "." line.
+
+    Args:
+        host (str): Server the menu came from (default for item hosts)
+        port (int): Port the menu came from (default for item ports)
+        on_item (callable): Called with each parsed item tuple
+        on_batch (callable): Called first with all the items parsed from one
+            chunk, e.g. to resolve their servers together
+        keep (bool): Also keep the raw bytes and parsed items, for callers
+            that cache the menu or record its children
+    """
+
+    def __init__(self, host, port, on_item, keep=False, on_batch=None):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.on_item = on_item
+        self.on_batch = on_batch
+        self.partial = bytearray()
+        self.data = bytearray() if keep else None
+        self.children = [] if keep else None
+        self.finished = False
+        self.encoding_errors = 0
+
+    def feed(self, chunk):
+        super().feed(chunk)
+        if self.data is not None:
+            self.data += chunk
+        if self.finished:
+            return
+        self.partial += chunk
+        self.parse(final=False)
+
+    def close(self):
+        """Parse a final line the server didn't terminate."""
+        if self.partial and not self.finished:
+            self.parse(final=True)
+        self.partial = bytearray()
+
+    def parse(self, final):
+        items = []
+        consumed, self.finished, bad = parse_lines(self.partial, self.host, self.port, items, final)
+        del self.partial[:consumed]
+        self.encoding_errors += bad
+        if items and self.on_batch is not None:
+            self.on_batch(items)
+        for item in items:
+            if self.children is not None:
+                self.children.append(item)
+            self.on_item(item)
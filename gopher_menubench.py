@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for menu parsing.
+
+Builds a synthetic menu of several megabytes and times the one-pass bytes
+parser in gopher_menu against the parsing the crawler used before it:
+decoding the whole menu, splitting it on CRLF and splitting each line on
+tabs. The streaming parser is timed too, fed in receive-sized chunks.
+
+    python3 gopher_menubench.py --size 16 --repeat 5
+"""
+
+import argparse
+import gc
+import random
+import time
+
+from gopher_menu import MenuStreamParser, parse_lines
+
+TYPES = "1" * 3 + "0" * 4 + "9" * 2 + "i" * 3 + "37gI"
+
+
+def build_menu(size_mb, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    n = 0
+    while total < size_mb * 1024 * 1024:
+        item_type = rng.choice(TYPES)
+        name = f"entry {n} " + "x" * rng.randrange(4, 60)
+        selector = "" if item_type == "i" else f"/dir{n % 97}/file-{n}.txt"
+        host = "" if n % 5 else "mirror.example.org"
+        line = f"{item_type}{name}\t{selector}\t{host}\t70"
+        lines.append(line)
+        total += len(line) + 2
+        n += 1
+    lines.append(".")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8"), n
+
+
+def legacy_parse_line(line, host, port):
+    parts = line.split('\t')
+    if len(parts) < 4 or not parts[0]:
+        return None
+    item_type = parts[0][0]
+    description = parts[0][1:].strip()
+    selector = parts[1]
+    item_host = parts[2] if parts[2] else host
+    try:
+        item_port = int(parts[3]) if parts[3] else port
+    except ValueError:
+        return None
+    return item_type, description, selector, item_host, item_port
+
+
+def legacy_parse(data, host, port):
+    """Whole-menu parsing as the crawler did it before parse_lines()."""
+    items = []
+    for line in data.decode('utf-8').split('\r\n'):
+        child = legacy_parse_line(line, host, port)
+        if child is not None:
+            items.append(child)
+    return items
+
+
+def legacy_stream(data, host, port, chunk):
+    """The old MenuStreamParser loop: copy out and decode each line."""
+    items = []
+    partial = bytearray()
+    for i in range(0, len(data), chunk):
+        partial += data[i:i + chunk]
+        start = 0
+        while True:
+            end = partial.find(b'\n', start)
+            if end < 0:
+                break
+            raw = partial[start:end]
+            start = end + 1
+            if raw.endswith(b'\r'):
+                raw = raw[:-1]
+            if raw == b'.':
+                return items
+            try:
+                child = legacy_parse_line(raw.decode('utf-8'), host, port)
+            except UnicodeDecodeError:
+                continue
+            if child is not None:
+                items.append(child)
+        del partial[:start]
+    return items
+
+
+def onepass(data, host, port):
+    items = []
+    parse_lines(data, host, port, items)
+    return items
+
+
+def onepass_stream(data, host, port, chunk):
+    items = []
+    parser = MenuStreamParser(host, port, items.append)
+    for i in range(0, len(data), chunk):
+        parser.feed(data[i:i + chunk])
+    parser.close()
+    return items
+
+
+def best_time(fn, repeat):
+    """Best of repeat runs, with the garbage collector off as timeit does."""
+    best = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Gopher menu parsing.")
+    parser.add_argument("--size", type=float, default=8, help="menu size in MiB")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk", type=int, default=65536,
+                        help="bytes per feed() for the streaming parsers")
+    args = parser.parse_args()
+
+    data, lines = build_menu(args.size)
+    host, port = "localhost", 70
+    print(f"Menu: {len(data) / 1024 / 1024:.1f} MiB, {lines} lines")
+
+    cases = [
+        ("decode + split (old)", lambda: legacy_parse(data, host, port)),
+        ("one-pass bytes", lambda: onepass(data, host, port)),
+        ("stream, per-line (old)", lambda: legacy_stream(data, host, port, args.chunk)),
+        ("stream, one-pass", lambda: onepass_stream(data, host, port, args.chunk)),
+    ]
+    expected = None
+    for name, fn in cases:
+        elapsed, items = best_time(fn, args.repeat)
+        items = [tuple(item) for item in items]
+        if expected is None:
+            expected = items
+        match = "" if items == expected else "  (items differ!)"
+        print(f"{name:<24} {elapsed * 1000:8.1f} ms  "
+              f"{len(data) / elapsed / 1024 / 1024:7.1f} MiB/s  {len(items)} items{match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Per-request timing for the crawler.
+
+Each fetch fills in a FetchTiming (DNS, connect, time to first byte,
+transfer and byte count). MetricsRegistry aggregates them into latency
+histograms labelled by server and item type, and exports them as JSON or in
+the Prometheus text format.
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+
+PHASES = ('dns', 'connect', 'ttfb', 'transfer', 'process')
+# Upper bounds in seconds, Prometheus style (each bucket counts values <= bound)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statuses counted as failed fetches; 'cached' and 'truncated' still got data
+FAILED = ('error', 'short-circuited')
+
+
+def label_value(value):
+    """Escape a Prometheus label value; hosts and types come from menus."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class FetchTiming:
+    """Durations (seconds) and size of a single fetch; unmeasured phases stay None."""
+
+    __slots__ = ('server', 'item_type', 'dns', 'connect', 'ttfb', 'transfer',
+                 'process', 'bytes', 'status', 'truncated', 'mark')
+
+    def __init__(self, server, item_type):
+        self.server = server
+        self.item_type = item_type
+        self.dns = self.connect = self.ttfb = self.transfer = self.process = None
+        self.bytes = 0
+        self.status = 'ok'
+        self.truncated = None  # why the transfer was cut short, if it was
+        self.mark = time.perf_counter()
+
+    def lap(self):
+        """Seconds since the previous lap (or since creation)."""
+        now = time.perf_counter()
+        elapsed = now - self.mark
+        self.mark = now
+        return elapsed
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'mark'}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        target = q * self.count
+        seen = 0
+        for bound, c in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += c
+            if seen >= target and c:
+                return bound
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {str(b): c for b, c in zip(BUCKETS + ('+Inf',), self.counts)},
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (phase, server, item_type) -> Histogram
+        self.histograms = defaultdict(Histogram)
+        # (server, item_type) -> totals
+        self.bytes = defaultdict(int)
+        self.requests = defaultdict(int)
+        self.failures = defaultdict(int)
+
+    def record(self, timing):
+        server = f"{timing.server[0]}:{timing.server[1]}"
+        key = (server, timing.item_type)
+        with self.lock:
+            for phase in PHASES:
+                value = getattr(timing, phase)
+                if value is not None:
+                    self.histograms[(phase, server, timing.item_type)].observe(value)
+            self.bytes[key] += timing.bytes
+            self.requests[key] += 1
+            if timing.status in FAILED:
+                self.failures[key] += 1
+
+    def export(self):
+        """Picklable copy of the counters, for merge() in another process."""
+        with self.lock:
+            return {'histograms': dict(self.histograms), 'bytes': dict(self.bytes),
+                    'requests': dict(self.requests), 'failures': dict(self.failures)}
+
+    def merge(self, exported):
+        with self.lock:
+            for key, hist in exported['histograms'].items():
+                self.histograms[key].merge(hist)
+            for name in ('bytes', 'requests', 'failures'):
+                totals = getattr(self, name)
+                for key, value in exported[name].items():
+                    totals[key] += value
+
+    def breakdown(self, by):
+        """Phase histograms merged per server (by=1) or per item type (by=2)."""
+        merged = defaultdict(lambda: defaultdict(Histogram))
+        for key, hist in self.histograms.items():
+            merged[key[by]][key[0]].merge(hist)
+        return {label: {phase: h.as_dict() for phase, h in phases.items()}
+                for label, phases in merged.items()}
+
+    def totals(self):
+        merged = defaultdict(Histogram)
+        for (phase, _, _), hist in self.histograms.items():
+            merged[phase].merge(hist)
+        return merged
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'phases': {phase: h.as_dict() for phase, h in self.totals().items()},
+                'by_server': self.breakdown(1),
+                'by_type': self.breakdown(2),
+                'requests': [{'server': s, 'type': t, 'requests': n,
+                              'failures': self.failures[(s, t)], 'bytes': self.bytes[(s, t)]}
+                             for (s, t), n in self.requests.items()],
+            }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_prometheus(self, path):
+        lines = [
+            "# HELP gopher_fetch_phase_seconds Time spent in each phase of a fetch.",
+            "# TYPE gopher_fetch_phase_seconds histogram",
+        ]
+        with self.lock:
+            for (phase, server, item_type), hist in sorted(self.histograms.items()):
+                labels = (f'phase="{phase}",server="{label_value(server)}",'
+                          f'type="{label_value(item_type)}"')
+                cumulative = 0
+                for bound, c in zip(BUCKETS + ('+Inf',), hist.counts):
+                    cumulative += c
+                    lines.append(f'gopher_fetch_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'gopher_fetch_phase_seconds_sum{{{labels}}} {hist.sum:.6f}')
+                lines.append(f'gopher_fetch_phase_seconds_count{{{labels}}} {hist.count}')
+
+            for name, help_text, values in (
+                    ('gopher_fetch_requests_total', 'Fetches attempted.', self.requests),
+                    ('gopher_fetch_failures_total', 'Fetches that failed.', self.failures),
+                    ('gopher_fetch_bytes_total', 'Bytes received.', self.bytes)):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (server, item_type), value in sorted(values.items()):
+                    lines.append(f'{name}{{server="{label_value(server)}",'
+                                 f'type="{label_value(item_type)}"}} {value}')
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+    def summary(self):
+        """One line of mean phase durations in milliseconds."""
+        with self.lock:
+            totals = self.totals()
+        parts = [f"{phase} {totals[phase].sum / totals[phase].count * 1000:.1f}"
+                 for phase in PHASES if totals[phase].count]
+        return "mean ms: " + ", ".join(parts) if parts else "no fetches timed"
@@ -0,0 +1,53 @@
+"""
+Reachability checks for external servers.
+
+Instead of connecting to each referenced server in turn during the crawl,
+the endpoints are collected and probed together with non-blocking connects
+under a single deadline for the whole batch, so the external servers report
+costs at most one timeout however many servers are listed.
+"""
+
+import asyncio
+import contextlib
+
+
+async def probe_one(host, port, limit, resolver):
+    async with limit:
+        if resolver is not None:
+            host, port = (await resolver.resolve_async(host, port))[0]
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.close()
+        with contextlib.suppress(OSError):
+            await writer.wait_closed()
+
+
+async def probe_all(endpoints, deadline, max_open, resolver):
+    limit = asyncio.Semaphore(max_open)
+    tasks = {asyncio.ensure_future(probe_one(host, port, limit, resolver)): (host, port)
+             for host, port in endpoints}
+    if not tasks:
+        return {}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return {endpoint: task in done and task.exception() is None
+            for task, endpoint in tasks.items()}
+
+
+def probe_endpoints(endpoints, deadline=3, max_open=256, resolver=None):
+    """
+    Check which endpoints accept a TCP connection.
+
+    Args:
+        endpoints (iterable): (host, port) pairs
+        deadline (float): Seconds allowed for the whole batch; endpoints
+            still connecting when it passes count as unreachable
+        max_open (int): Most connections attempted at once
+        resolver (Resolver): Name cache to resolve through, or None to let
+            each connect resolve its own name
+
+    Returns:
+        dict: (host, port) -> True if the server accepted a connection
+    """
+    return asyncio.run(probe_all(set(endpoints), deadline, max_open, resolver))
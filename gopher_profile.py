@@ -0,0 +1,266 @@
+"""
+Profiling mode for the crawler.
+
+CrawlProfiler runs a crawl under cProfile and tracemalloc, and splits time
+and memory into the crawler's phases: connect (name lookups, connecting and
+sending the request), receive (from the wait for the first byte on, so the
+server's think time counts here), menu parse, text classification and stats
+update. Threads blocked on a lock, queue or poll outside any phase (idle
+workers, the event loop waiting for sockets) count as "waiting", and the
+rest (the engines' own loops, event loop bookkeeping) as "other".
+
+A function belongs to a phase if it is listed in PHASE_RULES, by module and
+optionally by name. PhaseTracer hooks sys.settrace() to see those functions
+start and return, keeping a stack of open phases for each thread, and
+credits time to the innermost phase open. A blocking recv inside recv_all()
+is therefore receive time, and a wait on a shared DNS lookup connect time.
+Line events are switched off, so tracing costs one Python callback per
+function call, plus one per return from a phase function. Times are summed over threads, so with
+20 workers a 1 second crawl has 20 thread-seconds to share out. An
+allocation still held at the end of the crawl goes to the innermost frame
+of its traceback that belongs to a phase.
+
+cProfile only sees the thread that enables it, so worker threads run their
+target through wrap(), each with a profile of its own, and the profiles are
+merged at the end. The crawl writes PREFIX.pstats, for pstats or snakeviz,
+and PREFIX.txt with the phase totals, the slowest functions and the
+largest allocation sites.
+"""
+
+import cProfile
+import io
+import linecache
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# (module file, function name or '*' for the whole module) -> phase
+PHASE_RULES = {
+    ('gopher_resolve.py', '*'): 'connect',
+    ('gopher_probe.py', '*'): 'connect',
+    # Its wait for the first byte is in gopher_recv, so counts as receive
+    ('untitled0.py', 'send_request'): 'connect',
+    ('untitled0.py', 'send_request_async'): 'connect',
+    ('untitled0.py', 'receive_async'): 'receive',
+    ('untitled0.py', 'prefetch'): 'connect',
+    ('streams.py', 'open_connection'): 'connect',
+    ('socket.py', 'create_connection'): 'connect',
+    ('gopher_recv.py', '*'): 'receive',
+    ('streams.py', 'read'): 'receive',
+    ('streams.py', '_wait_for_data'): 'receive',
+    ('gopher_menu.py', '*'): 'menu parse',
+    ('untitled0.py', 'process_directory'): 'menu parse',
+    ('gopher_text.py', '*'): 'text classification',
+    ('untitled0.py', 'process_text_file'): 'text classification',
+    ('untitled0.py', 'is_text_file'): 'text classification',
+    ('gopher_stats.py', '*'): 'stats update',
+    ('gopher_metrics.py', '*'): 'stats update',
+    ('gopher_visited.py', '*'): 'stats update',
+    ('gopher_sink.py', '*'): 'stats update',
+    ('untitled0.py', 'visit'): 'stats update',
+    ('untitled0.py', 'record_error'): 'stats update',
+    ('untitled0.py', 'record_text_file'): 'stats update',
+    ('untitled0.py', 'process_binary_file'): 'stats update',
+}
+PHASES = ('connect', 'receive', 'menu parse', 'text classification', 'stats update',
+          'waiting', 'other')
+# Functions a thread blocks in when it has nothing to do
+WAITS = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('thread.py', '_worker'),
+}
+TRACE_FRAMES = 32
+
+
+def rule_phase(filename, name):
+    module = os.path.basename(filename)
+    return PHASE_RULES.get((module, name)) or PHASE_RULES.get((module, '*'))
+
+
+def function_ranges(filename):
+    """(first line, last line, name) of every function defined in a source file."""
+    source = ''.join(linecache.getlines(filename))
+    try:
+        code = compile(source, filename, 'exec')
+    except (SyntaxError, ValueError):
+        return []
+    ranges = []
+    stack = [code]
+    while stack:
+        code = stack.pop()
+        lines = [line for _, _, line in code.co_lines() if line is not None]
+        if lines and code.co_name != '<module>':
+            ranges.append((min(lines), max(lines), code.co_name))
+        stack.extend(c for c in code.co_consts if hasattr(c, 'co_lines'))
+    # Innermost (shortest) ranges first, so nested functions win
+    ranges.sort(key=lambda r: r[1] - r[0])
+    return ranges
+
+
+class PhaseTracer:
+    """Times each thread's stack of open phases through sys.settrace()."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counters = []
+        # code object -> phase, or None for code outside the phases
+        self.phases = {}
+
+    def start(self):
+        threading.settrace(self.call)
+        sys.settrace(self.call)
+
+    def stop(self):
+        sys.settrace(None)
+        threading.settrace(None)
+        self.switch(None)
+
+    def times(self):
+        total = Counter()
+        with self.lock:
+            for counter in self.counters:
+                total.update(counter)
+        return total
+
+    def switch(self, push):
+        """Credit the time since the last switch to the current phase, then push or pop."""
+        local = self.local
+        now = time.perf_counter()
+        if not hasattr(local, 'stack'):
+            local.stack = []
+            local.times = Counter()
+            local.mark = now
+            with self.lock:
+                self.counters.append(local.times)
+        stack = local.stack
+        current = stack[-1] if stack else 'other'
+        local.times[current] += now - local.mark
+        local.mark = now
+        if push is not None:
+            # A wait inside a phase is part of that phase
+            stack.append(current if push == 'waiting' and stack else push)
+        elif stack:
+            stack.pop()
+
+    def call(self, frame, event, arg):
+        code = frame.f_code
+        try:
+            phase = self.phases[code]
+        except KeyError:
+            phase = self.phases[code] = rule_phase(code.co_filename, code.co_name) or (
+                'waiting' if (os.path.basename(code.co_filename), code.co_name) in WAITS
+                else None)
+        if phase is None:
+            return None
+        self.switch(phase)
+        frame.f_trace_lines = False
+        return self.returned
+
+    def returned(self, frame, event, arg):
+        if event == 'return':
+            self.switch(None)
+        return self.returned
+
+
+class CrawlProfiler:
+    """
+    Args:
+        prefix (str): Output path prefix for PREFIX.pstats and PREFIX.txt
+        top (int): Functions and allocation sites listed in the report
+    """
+
+    def __init__(self, prefix, top=25):
+        self.prefix = prefix
+        self.top = top
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.main = None
+        self.tracer = None
+        self.snapshot = None
+        self.peak = 0
+        self.stats = None
+        self.ranges = {}
+
+    def start(self):
+        tracemalloc.start(TRACE_FRAMES)
+        self.tracer = PhaseTracer()
+        self.tracer.start()
+        self.main = cProfile.Profile()
+        self.main.enable()
+
+    def wrap(self, target):
+        """Run a thread's target under a profile of its own."""
+        def run(*args, **kwargs):
+            profile = cProfile.Profile()
+            with self.lock:
+                self.profiles.append(profile)
+            profile.enable()
+            try:
+                return target(*args, **kwargs)
+            finally:
+                profile.disable()
+        return run
+
+    def stop(self):
+        self.main.disable()
+        self.tracer.stop()
+        self.snapshot = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stats = pstats.Stats(self.main)
+        with self.lock:
+            for profile in self.profiles:
+                # A profile with no calls can't be loaded
+                if profile.getstats():
+                    self.stats.add(profile)
+
+    def frame_phase(self, frame):
+        ranges = self.ranges.get(frame.filename)
+        if ranges is None:
+            ranges = self.ranges[frame.filename] = function_ranges(frame.filename)
+        name = next((n for first, last, n in ranges if first <= frame.lineno <= last), '*')
+        return rule_phase(frame.filename, name)
+
+    def phase_allocations(self):
+        """Bytes still allocated at the end of the crawl, by phase."""
+        sizes = Counter()
+        for stat in self.snapshot.statistics('traceback'):
+            # Tracebacks run from the oldest frame to the most recent
+            phase = next((p for p in map(self.frame_phase, reversed(stat.traceback)) if p),
+                         'other')
+            sizes[phase] += stat.size
+        return sizes
+
+    def write(self):
+        """Write PREFIX.pstats and PREFIX.txt; returns the phase summary lines."""
+        self.stats.dump_stats(self.prefix + '.pstats')
+        times = self.tracer.times()
+        sizes = self.phase_allocations()
+        total_time = sum(times.values()) or 1
+        summary = [f"{phase:<20} {times[phase]:9.3f} s {times[phase] / total_time:6.1%}  "
+                   f"{sizes[phase] / 1024:10.1f} KiB" for phase in PHASES]
+
+        out = io.StringIO()
+        out.write("Time (thread-seconds) and memory still allocated at the end "
+                  "of the crawl, by phase:\n\n")
+        out.write("\n".join(summary))
+        out.write(f"\n\nPeak traced memory: {self.peak / 1024:.1f} KiB\n\n")
+        out.write(f"Top {self.top} functions by own time:\n")
+        self.stats.stream = out
+        self.stats.sort_stats('tottime').print_stats(self.top)
+        out.write(f"Top {self.top} allocation sites still allocated:\n\n")
+        for stat in self.snapshot.statistics('lineno')[:self.top]:
+            frame = stat.traceback[0]
+            out.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8} blocks  "
+                      f"{frame.filename}:{frame.lineno}\n")
+        with open(self.prefix + '.txt', 'w') as f:
+            f.write(out.getvalue())
+        return summary
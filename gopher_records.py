@@ -0,0 +1,79 @@
+"""
+Per-item records kept between crawls for incremental re-crawling.
+
+Each fetched item stores its size, a content digest and when it was last
+fetched. Text items also keep the sample shown for the smallest text file,
+and menus keep the children they listed, so an unchanged subtree can be
+counted again without touching the network.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class RecordStore:
+    def __init__(self, path, commit_every=500):
+        self.path = path
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        # Callers serialise access with the crawler's lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                id TEXT PRIMARY KEY,
+                item_type TEXT,
+                size INTEGER,
+                digest TEXT,
+                fetched_at REAL,
+                sample TEXT,
+                children TEXT
+            )
+        """)
+
+    def get(self, key):
+        """Returns the record for key as a dict, or None if there isn't one."""
+        row = self.conn.execute(
+            "SELECT item_type, size, digest, fetched_at, sample, children FROM records WHERE id = ?",
+            (key,)).fetchone()
+        if row is None:
+            return None
+        item_type, size, digest, fetched_at, sample, children = row
+        return {
+            'item_type': item_type,
+            'size': size,
+            'digest': digest,
+            'fetched_at': fetched_at,
+            'sample': sample,
+            'children': [tuple(c) for c in json.loads(children)] if children is not None else None,
+        }
+
+    def put(self, key, item_type, size, digest, sample=None, children=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, item_type, size, digest, time.time(), sample,
+             json.dumps(children) if children is not None else None))
+        self.written()
+
+    def touch(self, key):
+        """Mark an unchanged item as freshly fetched."""
+        self.conn.execute("UPDATE records SET fetched_at = ? WHERE id = ?", (time.time(), key))
+        self.written()
+
+    def written(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,187 @@
+"""
+Receive helpers shared by the Gopher crawlers.
+
+Responses are read with recv_into() straight into a preallocated bytearray
+that doubles when full, so a response costs a linear number of byte copies
+instead of the quadratic cost of ``data += chunk``. Callers that don't need
+the payload itself can stream it through a consumer instead.
+
+A TransferLimit caps the bytes and total time a response may take; past
+either cap the transfer stops early and the limit records why, so a server
+that streams forever or drips bytes can't stall the crawl.
+"""
+
+import hashlib
+import socket
+import time
+
+DEFAULT_BUFSIZE = 64 * 1024
+
+
+class TransferLimit:
+    """
+    Caps on a single response. After the transfer, truncated says why it
+    was cut short, or is None if it completed.
+
+    Args:
+        max_bytes (int): Bytes kept; None for no cap
+        max_time (float): Seconds the whole transfer may take; None for no cap
+    """
+
+    def __init__(self, max_bytes=None, max_time=None):
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+        self.deadline = None
+        self.truncated = None
+
+    def start(self):
+        if self.max_time is not None:
+            self.deadline = time.monotonic() + self.max_time
+
+    def room(self, used, bufsize):
+        """How much to read next: one byte past the cap shows there was more."""
+        if self.max_bytes is None:
+            return bufsize
+        return min(bufsize, self.max_bytes + 1 - used)
+
+    def keep(self, used, n):
+        """How many of n newly received bytes fit under the cap."""
+        if self.max_bytes is not None and used + n > self.max_bytes:
+            self.truncated = f"over {self.max_bytes} bytes"
+            return self.max_bytes - used
+        return n
+
+    def wait(self, timeout):
+        """The timeout for the next read, shortened to the deadline."""
+        if self.deadline is None:
+            return timeout
+        remaining = max(0.0, self.deadline - time.monotonic())
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def expired(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.truncated = f"over {self.max_time}s"
+            return True
+        return False
+
+
+def wait_for_data(sock):
+    """Block until the peer sends its first byte (or closes), without consuming it."""
+    sock.recv(1, socket.MSG_PEEK)
+
+
+def recv_into_limited(sock, view, limit, timeout):
+    """recv_into() under limit's deadline; returns 0 if the deadline passed."""
+    if limit.expired():
+        return 0
+    sock.settimeout(limit.wait(timeout))
+    try:
+        return sock.recv_into(view)
+    except socket.timeout:
+        if limit.expired():
+            return 0
+        raise
+
+
+def recv_all(sock, bufsize=DEFAULT_BUFSIZE, limit=None):
+    """
+    Read from sock until the peer closes the connection.
+
+    Args:
+        sock (socket.socket): A connected socket
+        bufsize (int): Initial buffer size; the buffer doubles as needed
+        limit (TransferLimit): Optional caps; the data is cut short past them
+
+    Returns:
+        bytes: Everything the peer sent, up to the limit
+    """
+    buf = bytearray(bufsize)
+    used = 0
+    if limit is not None:
+        limit.start()
+        timeout = sock.gettimeout()
+    while True:
+        if used == len(buf):
+            buf.extend(bytes(len(buf)))
+        # The views must be released before the buffer can grow again, even
+        # if something (a debugger, a profiler) still holds a frame using them
+        with memoryview(buf)[used:] as view:
+            if limit is None:
+                n = sock.recv_into(view)
+            else:
+                with view[:limit.room(used, len(view))] as part:
+                    n = recv_into_limited(sock, part, limit, timeout)
+                n = limit.keep(used, n)
+        used += n
+        if not n or (limit is not None and limit.truncated):
+            break
+    del buf[used:]
+    return bytes(buf)
+
+
+def recv_stream(sock, consumer, bufsize=DEFAULT_BUFSIZE, limit=None):
+    """
+    Read from sock until the peer closes, handing each chunk to consumer.
+
+    The chunk passed to consumer.feed() is a memoryview over a reused
+    buffer, so consumers must copy anything they want to keep.
+
+    Returns:
+        int: Total number of bytes received, up to the limit
+    """
+    buf = bytearray(bufsize)
+    total = 0
+    if limit is not None:
+        limit.start()
+        timeout = sock.gettimeout()
+    with memoryview(buf) as view:
+        while True:
+            if limit is None:
+                n = sock.recv_into(view)
+            else:
+                n = recv_into_limited(sock, view[:limit.room(total, bufsize)], limit, timeout)
+                n = limit.keep(total, n)
+            if n:
+                total += n
+                consumer.feed(view[:n])
+            if not n or (limit is not None and limit.truncated):
+                break
+    return total
+
+
+class SizeCounter:
+    """Consumer that only counts the bytes it is fed."""
+
+    def __init__(self):
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+
+
+class DigestCounter(SizeCounter):
+    """Consumer that counts and hashes the bytes it is fed."""
+
+    def __init__(self):
+        super().__init__()
+        self.hash = hashlib.blake2b(digest_size=16)
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        self.hash.update(chunk)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class Collector:
+    """Consumer that keeps the whole response in one growable buffer."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def feed(self, chunk):
+        self.data += chunk
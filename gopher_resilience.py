@@ -0,0 +1,164 @@
+"""
+Retries, adaptive timeouts and circuit breaking per Gopher server.
+
+Each server gets a smoothed latency estimate (in the style of TCP's RTO
+calculation) from which its timeout is derived, so fast servers fail fast
+instead of always costing the full default timeout. Transient failures are
+retried with jittered exponential backoff, and after repeated failures a
+server's circuit opens: requests to it fail immediately until a cooldown
+passes and a single probe request succeeds.
+"""
+
+import asyncio
+import random
+import socket
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Failures worth another attempt; refused connections and DNS errors are not
+TRANSIENT_ERRORS = (TimeoutError, socket.timeout, asyncio.TimeoutError, ConnectionResetError,
+                    ConnectionAbortedError, BrokenPipeError)
+
+
+class ServerHealth:
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.requests = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.trips = 0
+
+    def observe(self, latency):
+        if self.srtt is None:
+            self.srtt = latency
+            self.rttvar = latency / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - latency)
+            self.srtt = 0.875 * self.srtt + 0.125 * latency
+
+
+class ServerHealthTracker:
+    """
+    Args:
+        timeout (float): Default timeout, also the ceiling for adaptive ones
+        min_timeout (float): Floor for adaptive timeouts
+        retries (int): Extra attempts after a transient failure
+        backoff (float): Base delay for the first retry, doubled each time
+        max_backoff (float): Cap on a single retry delay
+        failure_threshold (int): Consecutive failures that open a circuit
+        cooldown (float): Seconds an open circuit waits before a probe
+    """
+
+    def __init__(self, timeout=5, min_timeout=0.5, retries=2, backoff=0.25, max_backoff=4,
+                 failure_threshold=3, cooldown=30, clock=time.monotonic):
+        self.timeout = timeout
+        self.min_timeout = min(min_timeout, timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.servers = {}
+
+    def health(self, server):
+        health = self.servers.get(server)
+        if health is None:
+            health = self.servers[server] = ServerHealth()
+        return health
+
+    def adaptive_timeout(self, health):
+        if health.srtt is None:
+            return self.timeout
+        return max(self.min_timeout, min(self.timeout, health.srtt + 4 * health.rttvar))
+
+    def timeout_for(self, server):
+        with self.lock:
+            return self.adaptive_timeout(self.health(server))
+
+    def allow(self, server):
+        """Whether a request to server may go ahead; counts short circuits."""
+        with self.lock:
+            health = self.health(server)
+            if health.state == OPEN and self.clock() - health.opened_at >= self.cooldown:
+                health.state = HALF_OPEN
+            if health.state == CLOSED or (health.state == HALF_OPEN and not health.probing):
+                health.probing = health.state == HALF_OPEN
+                health.requests += 1
+                return True
+            health.short_circuited += 1
+            return False
+
+    def success(self, server, latency=None):
+        with self.lock:
+            health = self.health(server)
+            if latency is not None:
+                health.observe(latency)
+            health.failures = 0
+            health.state = CLOSED
+            health.probing = False
+
+    def failure(self, server):
+        with self.lock:
+            health = self.health(server)
+            health.failures += 1
+            health.probing = False
+            if health.state == HALF_OPEN or (health.state == CLOSED
+                                             and health.failures >= self.failure_threshold):
+                health.state = OPEN
+                health.opened_at = self.clock()
+                health.trips += 1
+
+    def should_retry(self, server, error, attempt):
+        """Whether a failed attempt (numbered from 0) deserves another try."""
+        if attempt >= self.retries or not isinstance(error, TRANSIENT_ERRORS):
+            return False
+        with self.lock:
+            health = self.health(server)
+            if health.state != CLOSED:
+                return False
+            health.retries += 1
+        return True
+
+    def retry_delay(self, attempt):
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def merge(self, servers):
+        """Fold in another tracker's servers (e.g. from a shard process)."""
+        with self.lock:
+            for server, other in servers.items():
+                health = self.servers.get(server)
+                if health is None:
+                    self.servers[server] = other
+                    continue
+                health.retries += other.retries
+                health.short_circuited += other.short_circuited
+                health.trips += other.trips
+                health.requests += other.requests
+                if other.state != CLOSED:
+                    health.state = other.state
+                if other.srtt is not None and health.srtt is None:
+                    health.srtt, health.rttvar = other.srtt, other.rttvar
+
+    def report(self):
+        """Lines describing servers that needed retries or tripped their breaker."""
+        lines = []
+        with self.lock:
+            for (host, port), h in sorted(self.servers.items()):
+                if not (h.retries or h.short_circuited or h.trips):
+                    continue
+                lines.append(f"{host}:{port}: circuit {h.state}, {h.retries} retries, "
+                             f"{h.short_circuited} short-circuited, tripped {h.trips}x, "
+                             f"timeout {self.adaptive_timeout(h):.2f}s")
+        return lines
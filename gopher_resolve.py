@@ -0,0 +1,209 @@
+"""
+Name resolution and endpoint canonicalisation.
+
+Resolver caches getaddrinfo() results for `ttl` seconds (failures for
+`negative_ttl`), so a crawl resolves each server once rather than once per
+request. Lookups run in a small thread pool: the async engine can await
+them, a batch of names from one menu can be resolved concurrently with
+prefetch(), and callers asking for a name already being looked up share
+that lookup. getaddrinfo() doesn't report record TTLs, so one fixed TTL
+applies to every name.
+
+The same server can be listed under several spellings. canonical_host()
+folds the case and a trailing dot of a host name, and normalize_selector()
+optionally collapses equivalent path selectors. EndpointAliases goes further
+and maps every name that resolves to an address already seen (say
+"localhost" and "127.0.0.1") to the first name seen for it, so the server
+is crawled once.
+"""
+
+import asyncio
+import ipaddress
+import posixpath
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+SELECTOR_MODES = ('none', 'path')
+
+
+def canonical_host(host):
+    """Host names are case-insensitive, and "example.org." is "example.org"."""
+    return host.strip().rstrip('.').lower() or host
+
+
+def normalize_selector(selector, mode='none'):
+    """
+    Normalise a selector for use as a key. Selectors are opaque to Gopher, so
+    the default leaves them alone; 'path' treats those starting with "/" as
+    file paths, collapsing "//", "/./" and "dir/.." and dropping a trailing
+    "/", with "/" itself meaning the root selector "".
+    """
+    if mode == 'none' or not selector.startswith('/'):
+        return selector
+    path = posixpath.normpath(selector)
+    # normpath keeps a leading "//"
+    path = '/' + path.lstrip('/')
+    return '' if path == '/' else path
+
+
+def is_address(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class Resolver:
+    """
+    Args:
+        ttl (float): Seconds a successful lookup is reused
+        negative_ttl (float): Seconds a failed lookup is reused
+        workers (int): Lookups run at once
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30, workers=8):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.lock = threading.Lock()
+        # (host, port) -> (expires, Future of a list of socket addresses)
+        self.cache = {}
+        # Created on first use, so a forked shard process starts its own
+        self.pool = None
+        self.hits = 0
+        self.lookups = 0
+        self.failures = 0
+        # Names cached by merged resolvers, e.g. a shard process's
+        self.merged_names = set()
+
+    def lookup(self, host, port):
+        """A Future for host's addresses, shared with any lookup in progress."""
+        key = (host, port)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self.hits += 1
+                return entry[1]
+            self.lookups += 1
+            if is_address(host):
+                # Nothing to look up
+                future = Future()
+                future.set_result([(host, port)])
+                self.cache[key] = (None, future)
+                return future
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='resolver')
+            future = self.pool.submit(self.getaddrinfo, host, port)
+            # Counted as cached from now, so concurrent callers share it
+            self.cache[key] = (None, future)
+        future.add_done_callback(lambda f: self.expire(key, f))
+        return future
+
+    def getaddrinfo(self, host, port):
+        infos = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
+        return [info[4] for info in infos]
+
+    def expire(self, key, future):
+        ttl = self.ttl if future.exception() is None else self.negative_ttl
+        with self.lock:
+            if future.exception() is not None:
+                self.failures += 1
+            if self.cache.get(key, (None, None))[1] is future:
+                self.cache[key] = (time.monotonic() + ttl, future)
+
+    def resolve(self, host, port):
+        """Socket addresses for host and port; raises socket.gaierror on failure."""
+        return self.lookup(host, port).result()
+
+    async def resolve_async(self, host, port):
+        # Shielded, so a cancelled fetch doesn't cancel a lookup others share
+        return await asyncio.shield(asyncio.wrap_future(self.lookup(host, port)))
+
+    def prefetch(self, endpoints):
+        """Start looking up several (host, port) pairs at once."""
+        for host, port in set(endpoints):
+            self.lookup(host, port)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def export(self):
+        """Picklable copy of the counters, for merge() in another process."""
+        with self.lock:
+            return {'lookups': self.lookups, 'hits': self.hits, 'failures': self.failures,
+                    'names': set(self.cache) | self.merged_names}
+
+    def merge(self, exported):
+        with self.lock:
+            self.lookups += exported['lookups']
+            self.hits += exported['hits']
+            self.failures += exported['failures']
+            self.merged_names |= exported['names']
+
+    def summary(self):
+        names = len(self.merged_names.union(self.cache))
+        return (f"{self.lookups} lookups, {self.hits} cache hits, "
+                f"{self.failures} failed; {names} names cached")
+
+
+class EndpointAliases:
+    """
+    Maps (host, port) pairs that resolve to a shared address to one name.
+
+    Args:
+        resolver (Resolver): Resolves names not seen before
+    """
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.lock = threading.Lock()
+        # (address, port) -> canonical host
+        self.addresses = {}
+        self.names = {}
+        self.merged = 0
+
+    def known(self, host, port):
+        """Whether canonical() can answer for host:port without a lookup."""
+        return (host, port) in self.names
+
+    def canonical(self, host, port):
+        """The name host:port is crawled under; host is returned if it can't be resolved."""
+        name = self.names.get((host, port))
+        if name is not None:
+            return name
+        try:
+            addresses = self.resolver.resolve(host, port)
+        except OSError:
+            # Left to fail when fetched, under its own name
+            return host
+        return self.add(host, port, addresses)
+
+    async def canonical_async(self, host, port):
+        """canonical() for the event loop, awaiting the lookup instead of blocking."""
+        name = self.names.get((host, port))
+        if name is not None:
+            return name
+        try:
+            addresses = await self.resolver.resolve_async(host, port)
+        except OSError:
+            return host
+        return self.add(host, port, addresses)
+
+    def add(self, host, port, addresses):
+        with self.lock:
+            name = self.names.get((host, port))
+            if name is None:
+                name = next((self.addresses[(a[0], port)] for a in addresses
+                             if (a[0], port) in self.addresses), host)
+                for a in addresses:
+                    self.addresses.setdefault((a[0], port), name)
+                self.names[(host, port)] = name
+                if name != host:
+                    self.merged += 1
+        return name
@@ -0,0 +1,168 @@
+"""
+Per-server politeness scheduling for the concurrent crawl engines.
+
+Work is queued per (host, port). Servers take turns in round-robin order,
+and a server is skipped while it has max_in_flight requests outstanding or
+its token bucket is empty, so one slow or rate-limited host cannot starve
+the others.
+"""
+
+import time
+from collections import defaultdict, deque
+from queue import Empty, Queue
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class PolitenessScheduler:
+    """
+    Frontier keyed by server. Not thread-safe on its own; the async engine
+    uses it from a single event loop and PoliteQueue wraps it for threads.
+
+    Args:
+        max_in_flight (int): Requests allowed in flight per server (None = no cap)
+        rate (float): Requests per second per server (None = unlimited)
+        burst (int): Token bucket size when rate limiting
+    """
+
+    def __init__(self, max_in_flight=None, rate=None, burst=1, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.pending = {}
+        self.ring = deque()
+        self.in_flight = defaultdict(int)
+        self.buckets = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, key, job):
+        if key not in self.pending:
+            self.pending[key] = deque()
+            self.ring.append(key)
+        self.pending[key].append(job)
+        self.size += 1
+
+    def pop(self):
+        """
+        Take the next job from the next server allowed to send.
+
+        Returns:
+            tuple: (key, job, 0) when a job is available, otherwise
+            (None, None, wait) where wait is the seconds until a rate-limited
+            server gets a token, or None if only connection caps or an empty
+            frontier are in the way
+        """
+        now = self.clock()
+        wait = None
+        for _ in range(len(self.ring)):
+            key = self.ring[0]
+            self.ring.rotate(-1)
+
+            if self.max_in_flight is not None and self.in_flight[key] >= self.max_in_flight:
+                continue
+
+            bucket = None
+            if self.rate:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+                delay = bucket.delay(now)
+                if delay > 0:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                bucket.take()
+
+            jobs = self.pending[key]
+            job = jobs.popleft()
+            if not jobs:
+                # The key was just rotated to the back of the ring
+                del self.pending[key]
+                self.ring.pop()
+            self.size -= 1
+            self.in_flight[key] += 1
+            return key, job, 0
+        return None, None, wait
+
+    def release(self, key):
+        """Mark a request to key as finished."""
+        self.in_flight[key] -= 1
+        if not self.in_flight[key]:
+            del self.in_flight[key]
+
+    def in_flight_total(self):
+        return sum(self.in_flight.values())
+
+    def queue_depths(self):
+        """Pending jobs per server, deepest first."""
+        depths = {key: len(jobs) for key, jobs in self.pending.items()}
+        return dict(sorted(depths.items(), key=lambda kv: kv[1], reverse=True))
+
+
+class PoliteQueue(Queue):
+    """
+    A queue.Queue whose get() hands out jobs in PolitenessScheduler order.
+    Workers must call release(job) once they are done with a job's server.
+    """
+
+    def __init__(self, scheduler, key):
+        self.scheduler = scheduler
+        self.key = key
+        super().__init__()
+
+    def _init(self, maxsize):
+        pass
+
+    def _qsize(self):
+        return len(self.scheduler)
+
+    def _put(self, job):
+        self.scheduler.push(self.key(job), job)
+
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                key, job, wait = self.scheduler.pop()
+                if job is not None:
+                    self.not_full.notify()
+                    return job
+                if not block:
+                    raise Empty
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.not_empty.wait(wait)
+
+    def release(self, job):
+        with self.not_empty:
+            self.scheduler.release(self.key(job))
+            self.not_empty.notify()
+
+    def queue_depths(self):
+        with self.mutex:
+            return self.scheduler.queue_depths()
@@ -0,0 +1,105 @@
+"""
+Multi-process crawling.
+
+Items are partitioned across worker processes by a stable hash of their
+(type, selector, host, port) key, so every item has exactly one owning
+shard, which dedupes and fetches it. Links a shard discovers are routed to
+their owner's inbox. A shared counter of routed-but-unfinished items tells
+the shards when the whole crawl, not just their own inbox, has drained.
+"""
+
+import multiprocessing
+from hashlib import blake2b
+from queue import Empty
+
+
+def shard_of(key, shards):
+    """Owning shard of an item key; stable across processes, unlike hash()."""
+    digest = blake2b(key.encode('utf-8', 'surrogateescape'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+class ShardRouter:
+    """
+    Args:
+        shards (int): Number of worker processes
+        key (callable): Maps a routed item to its key string
+        context: multiprocessing context the queues are created in
+    """
+
+    def __init__(self, shards, key, context):
+        self.shards = shards
+        self.key = key
+        self.inboxes = [context.Queue() for _ in range(shards)]
+        # Items routed but not yet finished, across all shards
+        self.outstanding = context.Value('q', 0)
+
+    def route(self, item):
+        with self.outstanding.get_lock():
+            self.outstanding.value += 1
+        self.inboxes[shard_of(self.key(item), self.shards)].put(item)
+
+    def get(self, shard, timeout=0.1):
+        """Next item for shard, or None if its inbox stayed empty for timeout."""
+        try:
+            return self.inboxes[shard].get(timeout=timeout)
+        except Empty:
+            return None
+
+    def task_done(self):
+        """Mark an item finished; call only after routing its children."""
+        with self.outstanding.get_lock():
+            self.outstanding.value -= 1
+
+    def finished(self):
+        return self.outstanding.value == 0
+
+
+def run_shards(target, shards, key, seed):
+    """
+    Run target(shard, router) in one forked process per shard.
+
+    The processes are forked so each starts with a copy of the caller's
+    state, which isn't picklable. target returns the shard's results, which
+    must be picklable.
+
+    Args:
+        target (callable): Crawls one shard
+        shards (int): Number of processes
+        key (callable): Maps a routed item to its key string
+        seed: First item to route
+
+    Returns:
+        list: Each shard's result, in shard order
+    """
+    context = multiprocessing.get_context('fork')
+    router = ShardRouter(shards, key, context)
+    results = context.Queue()
+
+    def run(shard):
+        results.put((shard, target(shard, router)))
+
+    router.route(seed)
+    processes = [context.Process(target=run, args=(shard,), daemon=True)
+                 for shard in range(shards)]
+    for p in processes:
+        p.start()
+    try:
+        # Read results before joining, so no child blocks on a full pipe
+        collected = {}
+        while len(collected) < shards:
+            try:
+                shard, result = results.get(timeout=1)
+            except Empty:
+                for shard, p in enumerate(processes):
+                    if shard not in collected and p.exitcode not in (None, 0):
+                        raise RuntimeError(f"shard {shard} exited with code {p.exitcode}")
+                continue
+            collected[shard] = result
+        for p in processes:
+            p.join()
+    finally:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+    return [collected[shard] for shard in range(shards)]
@@ -0,0 +1,106 @@
+"""
+Per-item results written while the crawl runs.
+
+ResultSink appends one record per fetched item (type, selector, server,
+size, status and phase timings) to a JSON Lines or CSV file, optionally
+gzipped. Records are buffered and written in batches, at least every
+`interval` seconds while results keep arriving, so other tools can follow
+the file during a crawl and a crash loses at most one batch.
+"""
+
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+
+from gopher_metrics import PHASES
+
+FIELDS = ('time', 'type', 'selector', 'host', 'port', 'size', 'status', 'error') + PHASES
+
+
+def split_suffix(path):
+    """("results", ".jsonl.gz") for "results.jsonl.gz"."""
+    suffix = ''
+    if path.endswith('.gz'):
+        path, suffix = path[:-3], '.gz'
+    root, ext = os.path.splitext(path)
+    return root, ext + suffix
+
+
+class ResultSink:
+    """
+    Args:
+        path (str): Output file; a .gz suffix compresses it
+        format (str): 'jsonl' or 'csv'; by default taken from the extension
+        batch (int): Records buffered before a write
+        interval (float): Seconds after which a partial batch is written anyway
+    """
+
+    def __init__(self, path, format=None, batch=256, interval=1.0):
+        self.path = path
+        self.compress = path.endswith('.gz')
+        self.format = format or ('csv' if split_suffix(path)[1].startswith('.csv') else 'jsonl')
+        self.batch = batch
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.file = None
+        self.writer = None
+        self.written = 0
+        self.last_flush = time.monotonic()
+
+    def for_shard(self, shard):
+        """A sink for one shard process, writing beside this sink's file."""
+        root, ext = split_suffix(self.path)
+        return ResultSink(f"{root}.shard{shard}{ext}", self.format, self.batch, self.interval)
+
+    def open(self, append=False):
+        """Start the file, or with append continue a resumed crawl's."""
+        fresh = not (append and os.path.exists(self.path) and os.path.getsize(self.path))
+        mode = 'wt' if fresh else 'at'
+        if self.compress:
+            # Each append adds a gzip member; readers see one stream
+            self.file = gzip.open(self.path, mode, encoding='utf-8', newline='')
+        else:
+            self.file = open(self.path, mode, encoding='utf-8', newline='')
+        if self.format == 'csv':
+            self.writer = csv.writer(self.file)
+            if fresh:
+                self.writer.writerow(FIELDS)
+
+    def record(self, item_type, selector, host, port, timing, error=None):
+        row = [round(time.time(), 3), item_type, selector, host, port, timing.bytes,
+               timing.status, error]
+        row += [None if getattr(timing, p) is None else round(getattr(timing, p), 6)
+                for p in PHASES]
+        with self.lock:
+            self.buffer.append(row)
+            if (len(self.buffer) >= self.batch
+                    or time.monotonic() - self.last_flush >= self.interval):
+                self.flush_buffer()
+
+    def flush_buffer(self):
+        # Called with self.lock held
+        if self.file is None:
+            self.open()
+        if self.writer is not None:
+            self.writer.writerows(self.buffer)
+        else:
+            self.file.write(''.join(json.dumps(dict(zip(FIELDS, row))) + '\n'
+                                    for row in self.buffer))
+        # A gzip flush ends the deflate block, so readers can decode
+        # everything written so far
+        self.file.flush()
+        self.written += len(self.buffer)
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.buffer:
+                self.flush_buffer()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,183 @@
+"""
+Constant-memory crawl statistics.
+
+PathSummary and ErrorLog stand in for the lists of paths and error messages
+the crawler used to keep: they support append() and len(), but only hold
+what the summary prints (the first few paths in sorted order, the first few
+errors), plus counts, a size histogram, the largest and smallest files and
+per-server error counts. Full listings are written to disk as they are
+recorded, and only when a listing file is given.
+
+Both serialise with to_dict()/from_dict() for checkpoints and combine with
+merge() for the sharded engine.
+"""
+
+import bisect
+import heapq
+from collections import Counter
+
+
+class Listing:
+    """Append-only text file of one entry per line, opened on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def write(self, entry):
+        if self.file is None:
+            # Line buffered, so shard processes appending to the same file
+            # never split each other's lines
+            self.file = open(self.path, 'a', buffering=1, encoding='utf-8', errors='replace')
+        self.file.write(entry.replace('\n', ' ') + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class PathSummary:
+    """
+    Args:
+        listing (str): File to append every recorded path to, or None
+        first (int): Sorted paths kept for the summary listing
+        top (int): Largest and smallest files kept
+    """
+
+    def __init__(self, listing=None, first=10, top=5):
+        self.listing = Listing(listing) if listing else None
+        self.first_n = first
+        self.top_n = top
+        self.count = 0
+        self.total_bytes = 0
+        self.first = []        # sorted, at most first_n paths
+        self.largest = []      # min-heap of (size, path)
+        self.smallest = []     # min-heap of (-size, path), i.e. a max-heap on size
+        self.histogram = Counter()  # size.bit_length() -> files, i.e. power-of-two buckets
+
+    def __len__(self):
+        return self.count
+
+    def append(self, path, size=None):
+        self.count += 1
+        if len(self.first) < self.first_n or path < self.first[-1]:
+            bisect.insort(self.first, path)
+            del self.first[self.first_n:]
+        if self.listing is not None:
+            self.listing.write(path)
+        if size is not None:
+            self.add_size(size, path)
+
+    def add_size(self, size, path):
+        self.total_bytes += size
+        self.histogram[size.bit_length()] += 1
+        if len(self.largest) < self.top_n:
+            heapq.heappush(self.largest, (size, path))
+        elif size > self.largest[0][0]:
+            heapq.heapreplace(self.largest, (size, path))
+        if len(self.smallest) < self.top_n:
+            heapq.heappush(self.smallest, (-size, path))
+        elif size < -self.smallest[0][0]:
+            heapq.heapreplace(self.smallest, (-size, path))
+
+    def top_largest(self):
+        return sorted(self.largest, reverse=True)
+
+    def top_smallest(self):
+        return sorted((-size, path) for size, path in self.smallest)
+
+    def histogram_buckets(self):
+        """{upper bound in bytes: files}, e.g. {1024: 3} counts sizes 512..1023."""
+        return {(1 << bits): n for bits, n in sorted(self.histogram.items())}
+
+    def merge(self, other):
+        self.count += other.count
+        for path in other.first:
+            if len(self.first) < self.first_n or path < self.first[-1]:
+                bisect.insort(self.first, path)
+        del self.first[self.first_n:]
+        self.total_bytes += other.total_bytes
+        self.histogram.update(other.histogram)
+        self.largest = heapq.nlargest(self.top_n, self.largest + other.largest)
+        heapq.heapify(self.largest)
+        self.smallest = heapq.nlargest(self.top_n, self.smallest + other.smallest)
+        heapq.heapify(self.smallest)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_bytes': self.total_bytes,
+            'first': self.first,
+            'largest': self.largest,
+            'smallest': self.smallest,
+            'histogram': dict(self.histogram),
+        }
+
+    def from_dict(self, d):
+        """Load counters saved by to_dict(), keeping this summary's listing file."""
+        self.count = d['count']
+        self.total_bytes = d['total_bytes']
+        self.first = list(d['first'])
+        self.largest = [tuple(x) for x in d['largest']]
+        self.smallest = [tuple(x) for x in d['smallest']]
+        heapq.heapify(self.largest)
+        heapq.heapify(self.smallest)
+        # JSON turns the integer keys into strings
+        self.histogram = Counter({int(k): v for k, v in d['histogram'].items()})
+        return self
+
+    def report(self):
+        return {
+            'count': self.count,
+            'total_bytes': self.total_bytes,
+            'largest': [{'path': p, 'size': s} for s, p in self.top_largest()],
+            'smallest': [{'path': p, 'size': s} for s, p in self.top_smallest()],
+            'size_histogram': {str(k): v for k, v in self.histogram_buckets().items()},
+        }
+
+
+class ErrorLog:
+    """
+    Args:
+        listing (str): File to append every error message to, or None
+        first (int): Messages kept, in the order they were recorded
+    """
+
+    def __init__(self, listing=None, first=5):
+        self.listing = Listing(listing) if listing else None
+        self.first_n = first
+        self.count = 0
+        self.first = []
+        self.by_server = Counter()
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def append(self, message, server=None):
+        self.count += 1
+        if len(self.first) < self.first_n:
+            self.first.append(message)
+        self.by_server[server or 'unknown'] += 1
+        if self.listing is not None:
+            self.listing.write(f"{server or '-'}\t{message}")
+
+    def merge(self, other):
+        self.count += other.count
+        self.first = (self.first + other.first)[:self.first_n]
+        self.by_server.update(other.by_server)
+
+    def to_dict(self):
+        return {'count': self.count, 'first': self.first, 'by_server': dict(self.by_server)}
+
+    def from_dict(self, d):
+        self.count = d['count']
+        self.first = list(d['first'])
+        self.by_server = Counter(d['by_server'])
+        return self
+
+    def report(self):
+        return {'count': self.count, 'by_server': dict(self.by_server.most_common())}
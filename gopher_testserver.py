@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Local synthetic Gopher server for testing and benchmarking the crawlers.
+
+Content is generated on demand from the selector, so arbitrarily large
+trees cost no memory. The shape of the tree is set by a TreeSpec: menu
+width and depth, files per menu, a deep chain of menus, links that form
+cycles, multi-megabyte binaries, malformed lines, slow and tarpit
+responses, and references to external servers.
+
+Two special selectors report and reset the server's counters:
+"/__stats__" returns {"requests": ..., "bytes": ...} as JSON, and
+"/__reset__" zeroes them.
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+from dataclasses import asdict, dataclass
+
+CHUNK = 64 * 1024
+
+
+@dataclass
+class TreeSpec:
+    width: int = 4              # submenus per menu
+    depth: int = 3              # levels of submenus below the root
+    texts: int = 3              # text files per menu
+    binaries: int = 1           # binary files per menu
+    text_size: int = 200        # bytes in the first text file of a menu
+    binary_size: int = 4096     # bytes in the first binary file of a menu
+    chain: int = 0              # length of a linear chain of menus off the root
+    cycles: bool = True         # menus link back to their parent and the root
+    malformed: int = 1          # malformed lines per menu
+    externals: int = 2          # external server references in the root menu
+    external_host: str = "127.0.0.1"
+    external_port: int = 1      # first external port; nothing should listen there
+    delay: float = 0.0          # seconds before every response
+    tarpit: float = 0.0         # if set, /tarpit drips one byte a second for this long
+
+
+class GopherTestServer:
+    def __init__(self, spec=None, host="127.0.0.1", port=0):
+        self.spec = spec or TreeSpec()
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.bytes_sent = 0
+        self.server = None
+        self.loop = None
+
+    # -- content ------------------------------------------------------
+
+    def menu_line(self, item_type, display, selector, host=None, port=None):
+        host = self.host if host is None else host
+        port = self.port if port is None else port
+        return f"{item_type}{display}\t{selector}\t{host}\t{port}\r\n"
+
+    def menu(self, path):
+        spec = self.spec
+        prefix = "/m" + "".join(f"/{i}" for i in path)
+        lines = [self.menu_line('i', f"Menu {prefix}", "fake", "(NULL)", 0)]
+
+        if len(path) < spec.depth:
+            for i in range(spec.width):
+                lines.append(self.menu_line('1', f"Menu {i}", f"{prefix}/{i}"))
+        for j in range(spec.texts):
+            lines.append(self.menu_line('0', f"Text {j}", f"{prefix}/t{j}"))
+        for j in range(spec.binaries):
+            lines.append(self.menu_line('9', f"Binary {j}", f"{prefix}/b{j}"))
+        for j in range(spec.malformed):
+            lines.append("this line has no fields\r\n" if j % 2 == 0
+                         else "0Broken entry\tonly-a-selector\r\n")
+        if spec.cycles and path:
+            parent = "/m" + "".join(f"/{i}" for i in path[:-1]) if len(path) > 1 else ""
+            lines.append(self.menu_line('1', "Up", parent))
+            lines.append(self.menu_line('1', "Home", ""))
+
+        if not path:
+            lines.append(self.menu_line('3', "Broken link", "/missing"))
+            if spec.chain:
+                lines.append(self.menu_line('1', "Chain", "/chain/0"))
+            if spec.tarpit:
+                lines.append(self.menu_line('0', "Tarpit", "/tarpit"))
+            for k in range(spec.externals):
+                port = spec.external_port + k
+                item_type = '1' if k % 2 == 0 else 'h'
+                lines.append(self.menu_line(item_type, f"External {k}", "/",
+                                            spec.external_host, port))
+        return "".join(lines).encode() + b".\r\n"
+
+    def chain_menu(self, k):
+        lines = [self.menu_line('0', f"Chain text {k}", f"/chain/{k}/t")]
+        if k + 1 < self.spec.chain:
+            lines.append(self.menu_line('1', f"Chain {k + 1}", f"/chain/{k + 1}"))
+        return "".join(lines).encode() + b".\r\n"
+
+    def text(self, selector, j):
+        size = self.spec.text_size * (j + 1)
+        line = f"Contents of {selector}\n".encode()
+        return (line * (size // len(line) + 1))[:size]
+
+    def binary_chunks(self, j):
+        size = self.spec.binary_size * (j + 1)
+        block = bytes(range(256)) * (CHUNK // 256)
+        while size > 0:
+            yield block[:size]
+            size -= len(block)
+
+    def resolve(self, selector):
+        """Returns an iterable of byte chunks for selector, or None if it doesn't exist."""
+        if selector == "":
+            return [self.menu(())]
+        parts = selector.strip("/").split("/")
+        try:
+            if parts[0] == "m":
+                path = tuple(int(p) for p in parts[1:] if p[0] not in "tb")
+                if len(path) > self.spec.depth or any(i >= self.spec.width for i in path):
+                    return None
+                last = parts[-1]
+                if last.startswith("t") and int(last[1:]) < self.spec.texts:
+                    return [self.text(selector, int(last[1:]))]
+                if last.startswith("b") and int(last[1:]) < self.spec.binaries:
+                    return self.binary_chunks(int(last[1:]))
+                if len(path) == len(parts) - 1:
+                    return [self.menu(path)]
+            elif parts[0] == "chain" and int(parts[1]) < self.spec.chain:
+                if len(parts) == 3:
+                    return [self.text(selector, 0)]
+                return [self.chain_menu(int(parts[1]))]
+        except (ValueError, IndexError):
+            return None
+        return None
+
+    # -- serving ------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        try:
+            line = await reader.readline()
+            selector = line.decode("utf-8", "replace").rstrip("\r\n")
+            if selector == "/__stats__":
+                writer.write(json.dumps({"requests": self.requests, "bytes": self.bytes_sent}).encode())
+                return
+            if selector == "/__reset__":
+                self.requests = self.bytes_sent = 0
+                return
+
+            self.requests += 1
+            if self.spec.delay:
+                await asyncio.sleep(self.spec.delay)
+            if selector == "/tarpit" and self.spec.tarpit:
+                await self.drip(writer)
+                return
+
+            chunks = self.resolve(selector)
+            if chunks is None:
+                chunks = [b"3Not found\t\terror.host\t1\r\n.\r\n"]
+            for chunk in chunks:
+                writer.write(chunk)
+                self.bytes_sent += len(chunk)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def drip(self, writer):
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.spec.tarpit
+        while loop.time() < end:
+            writer.write(b"x")
+            self.bytes_sent += 1
+            await writer.drain()
+            await asyncio.sleep(1)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    def start_in_thread(self):
+        """Serve from a daemon thread; returns the bound port."""
+        started = threading.Event()
+
+        def run():
+            async def main():
+                await self.start()
+                started.set()
+                await self.server.serve_forever()
+            try:
+                asyncio.run(main())
+            except asyncio.CancelledError:
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+
+
+def spec_arguments(parser):
+    """Add a --option for every TreeSpec field."""
+    for name, value in asdict(TreeSpec()).items():
+        flag = "--" + name.replace("_", "-")
+        if isinstance(value, bool):
+            parser.add_argument(flag, type=lambda v: v.lower() in ("1", "true", "yes"), default=value)
+        else:
+            parser.add_argument(flag, type=type(value), default=value)
+
+
+def spec_from_args(args):
+    return TreeSpec(**{name: getattr(args, name) for name in asdict(TreeSpec())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Gopher tree.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7070)
+    spec_arguments(parser)
+    args = parser.parse_args()
+
+    server = GopherTestServer(spec_from_args(args), args.host, args.port)
+
+    async def serve():
+        port = await server.start()
+        print(f"Serving synthetic gopher tree on {args.host}:{port}", flush=True)
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
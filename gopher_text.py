@@ -0,0 +1,117 @@
+"""
+Incremental text classification for downloaded files.
+
+TextClassifier is a receive consumer for items served as text. It checks
+the response is UTF-8 with an incremental decoder as each chunk arrives,
+so a multibyte character split across chunks is handled, and it keeps only
+the first few characters as a sample. A large text file is therefore never
+held in memory, either as bytes or as one decoded str.
+
+Files that start with the signature of a common binary format are
+classified as binary at once, and the rest of the response is only
+counted and hashed. Several of these formats (ZIP, PDF, ELF) begin with
+bytes that are valid UTF-8, so decoding alone would pass them as text.
+"""
+
+import codecs
+
+from gopher_recv import DigestCounter
+
+SAMPLE_CHARS = 1000
+# Leading bytes of binary formats, checked before any decoding
+BINARY_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'%PDF-', 'PDF'),
+    (b'PK\x03\x04', 'ZIP'),
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b"7z\xbc\xaf'\x1c", '7z'),
+    (b'\x7fELF', 'ELF'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'OLE2'),
+    # Magic numbers that are plain ASCII also need the binary bytes that
+    # follow them, or text that happens to start with "ID3" would match:
+    # Ogg stream version 0, FLAC's STREAMINFO block header, ID3v2.2-2.4
+    # with a zero revision byte
+    (b'OggS\x00', 'Ogg'),
+    (b'fLaC\x00\x00\x00\x22', 'FLAC'),
+    (b'fLaC\x80\x00\x00\x22', 'FLAC'),
+    (b'ID3\x02\x00', 'MP3'),
+    (b'ID3\x03\x00', 'MP3'),
+    (b'ID3\x04\x00', 'MP3'),
+)
+SIGNATURE_BYTES = max(len(magic) for magic, _ in BINARY_SIGNATURES)
+CHUNK = 64 * 1024
+
+
+def binary_signature(head):
+    """Name of the binary format head starts with, or None."""
+    for magic, name in BINARY_SIGNATURES:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+class TextClassifier(DigestCounter):
+    """
+    Consumer that validates a text response as it streams in.
+
+    After close(), `binary` is None for a UTF-8 text file, and otherwise
+    says why it isn't one.
+
+    Args:
+        sample_chars (int): Leading characters kept in `sample`
+        sink: Another consumer fed the same bytes, e.g. a CacheWriter
+    """
+
+    def __init__(self, sample_chars=SAMPLE_CHARS, sink=None):
+        super().__init__()
+        self.sample_chars = sample_chars
+        self.sink = sink
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.head = b''
+        self.sample = ''
+        self.binary = None
+
+    def feed(self, chunk):
+        super().feed(chunk)
+        if self.sink is not None:
+            self.sink.feed(chunk)
+        if self.binary is not None:
+            return
+        if len(self.head) < SIGNATURE_BYTES:
+            self.head += bytes(chunk[:SIGNATURE_BYTES - len(self.head)])
+            name = binary_signature(self.head)
+            if name is not None:
+                self.binary = f"{name} signature"
+                return
+        self.decode(chunk, False)
+
+    def close(self, final=True):
+        """
+        Finish decoding. With final=False (a response cut short), a
+        character split by the cut isn't counted against the file.
+        """
+        if self.binary is None and final:
+            self.decode(b'', True)
+
+    def decode(self, chunk, final):
+        try:
+            text = self.decoder.decode(chunk, final)
+        except UnicodeDecodeError:
+            self.binary = "invalid UTF-8"
+            return
+        if len(self.sample) < self.sample_chars:
+            self.sample += text[:self.sample_chars - len(self.sample)]
+
+
+def classify(data, sample_chars=SAMPLE_CHARS):
+    """Run a response already in memory through a TextClassifier."""
+    classifier = TextClassifier(sample_chars)
+    with memoryview(data) as view:
+        for start in range(0, len(view), CHUNK):
+            classifier.feed(view[start:start + CHUNK])
+    classifier.close()
+    return classifier
@@ -0,0 +1,168 @@
+"""
+Visited-set backends for the crawler.
+
+Every backend has the same small interface: add(item_type, selector, host,
+port) returns True the first time an item is seen, and memory_bytes()
+estimates what the set occupies.
+
+- ItemSet keeps full identifier strings, as the crawler always has.
+- CompactSet interns each (host, port) and keeps a 64-bit fingerprint per
+  item in an array-backed open-addressing table, so an item costs about 16
+  bytes however long its selector. Two items only collide if their 64-bit
+  hashes do, which is negligible for any crawl that fits in memory.
+- BloomSet is fixed-size and lossy: it never forgets an item, but with
+  probability error_rate reports a new one as seen, so that item (and
+  anything only reachable through it) is skipped.
+"""
+
+import math
+import sys
+from array import array
+from hashlib import blake2b
+
+EMPTY = 0
+MASK64 = (1 << 64) - 1
+
+
+class ServerIds:
+    """Interns (host, port) pairs so items hash a small id, not the host."""
+
+    def __init__(self):
+        self.servers = {}
+
+    def server_id(self, host, port):
+        server = (host, port)
+        sid = self.servers.get(server)
+        if sid is None:
+            sid = self.servers[server] = len(self.servers)
+        return sid
+
+    def servers_bytes(self):
+        return sys.getsizeof(self.servers) + sum(
+            sys.getsizeof(server) + sys.getsizeof(server[0]) for server in self.servers)
+
+
+class ItemSet:
+    kind = 'exact strings'
+
+    def __init__(self):
+        self.items = set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item_type, selector, host, port):
+        identifier = f"{item_type}{selector}@{host}:{port}"
+        if identifier in self.items:
+            return False
+        self.items.add(identifier)
+        return True
+
+    def memory_bytes(self):
+        return sys.getsizeof(self.items) + sum(sys.getsizeof(i) for i in self.items)
+
+
+class CompactSet(ServerIds):
+    kind = 'exact compact'
+
+    def __init__(self, capacity=1024):
+        super().__init__()
+        size = 8
+        while size < capacity * 2:
+            size *= 2
+        self.table = array('Q', bytes(8 * size))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, item_type, selector, host, port):
+        # hash() is salted per process, which is fine for an in-memory set
+        h = hash((self.server_id(host, port), item_type, selector)) & MASK64
+        h = h or 1  # 0 marks an empty slot
+        if not self.insert(h):
+            return False
+        self.count += 1
+        # Keep the table at most half full so probe runs stay short
+        if self.count * 2 > len(self.table):
+            self.grow()
+        return True
+
+    def insert(self, h):
+        table = self.table
+        mask = len(table) - 1
+        i = h & mask
+        while table[i] != EMPTY:
+            if table[i] == h:
+                return False
+            i = (i + 1) & mask
+        table[i] = h
+        return True
+
+    def grow(self):
+        old = self.table
+        self.table = array('Q', bytes(16 * len(old)))
+        for h in old:
+            if h != EMPTY:
+                self.insert(h)
+
+    def memory_bytes(self):
+        return self.table.buffer_info()[1] * self.table.itemsize + self.servers_bytes()
+
+
+class BloomSet(ServerIds):
+    """
+    Args:
+        capacity (int): Items the filter is sized for; past this the false
+            positive rate climbs above error_rate
+        error_rate (float): Target chance that a new item is reported as seen
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        super().__init__()
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    @property
+    def kind(self):
+        return f"bloom, {self.estimated_error_rate():.4%} false positives"
+
+    def __len__(self):
+        return self.count
+
+    def add(self, item_type, selector, host, port):
+        key = f"{self.server_id(host, port)}\0{item_type}{selector}"
+        digest = blake2b(key.encode('utf-8', 'surrogateescape'), digest_size=16).digest()
+        # Double hashing: k positions from two independent 64-bit hashes
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        new = False
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % self.bits
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            if not self.array[byte] & mask:
+                self.array[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def estimated_error_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def memory_bytes(self):
+        return len(self.array) + self.servers_bytes()
+
+
+BACKENDS = {'set': ItemSet, 'compact': CompactSet, 'bloom': BloomSet}
+
+
+def make_visited(kind='set', capacity=1_000_000, error_rate=0.001):
+    """Create a visited-set backend by name: 'set', 'compact' or 'bloom'."""
+    if kind == 'bloom':
+        return BloomSet(capacity, error_rate)
+    return BACKENDS[kind]()
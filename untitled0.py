@@ -6,125 +6,683 @@ Created on Tue Apr 22 16:31:11 2025
 @author: shiv
 """
 
+import argparse
+import asyncio
+import json
+import os
 import socket
+import threading
 import time
 from collections import defaultdict
 from urllib.parse import urlparse
-from queue import Queue
+from queue import Empty
+
+from gopher_cache import MENU_TTL, CacheWriter, ResponseCache
+from gopher_checkpoint import Checkpoint, CompletionGate
+from gopher_frontier import CrawlBudget, Frontier
+from gopher_menu import MenuStreamParser, parse_lines
+from gopher_metrics import FetchTiming, MetricsRegistry
+from gopher_probe import probe_endpoints
+from gopher_profile import CrawlProfiler
+from gopher_records import RecordStore, content_digest
+from gopher_resolve import (EndpointAliases, Resolver, canonical_host,
+                            normalize_selector)
+from gopher_resilience import ServerHealthTracker
+from gopher_shard import run_shards
+from gopher_sink import ResultSink
+from gopher_stats import ErrorLog, PathSummary
+from gopher_text import TextClassifier, classify
+from gopher_visited import make_visited
+from gopher_recv import (DEFAULT_BUFSIZE, Collector, DigestCounter, SizeCounter, TransferLimit,
+                         recv_all, recv_stream, wait_for_data)
+from gopher_scheduler import PoliteQueue, PolitenessScheduler
+
+FETCHED_TYPES = ('1', '0', 'I', '9')
+# Items whose server is contacted; info and error lines often carry
+# placeholder hosts ("error.host", "fake") that are never looked up
+CONTACTED_TYPES = FETCHED_TYPES + ('h',)
+# Caps on a single response by item type ('*' for the rest); a transfer
+# past them is cut short and recorded as truncated
+MAX_ITEM_BYTES = {'1': 16 * 1024 * 1024, '0': 64 * 1024 * 1024}
+MAX_ITEM_TIME = {'*': 300}
+
+def item_id(item_type, selector, host, port):
+    return f"{item_type}{selector}@{host}:{port}"
+
+def split_item_id(identifier):
+    """Inverse of item_id(): (item_type, selector, host, port)."""
+    selector, server = identifier[1:].rsplit('@', 1)
+    host, port = server.rsplit(':', 1)
+    return identifier[0], selector, host, int(port)
+
+def parse_caps(spec):
+    """Parse "TYPE=VALUE,..." (e.g. "0=1000000,*=none") into {type: float or None}."""
+    caps = {}
+    for part in spec.split(','):
+        item_type, sep, value = part.partition('=')
+        if not sep or not item_type:
+            raise argparse.ArgumentTypeError(f"expected TYPE=VALUE, got {part!r}")
+        caps[item_type] = None if value.lower() == 'none' else float(value)
+    return caps
+
+def parse_seconds(value):
+    """Parse a number of seconds, or "none" for no limit."""
+    return None if value.lower() == 'none' else float(value)
+
+def job_server(job):
+    """(host, port) of a (type, selector, host, port) frontier job."""
+    return job[2], job[3]
+
+def describe_error(e):
+    # asyncio timeouts stringify to an empty message
+    if isinstance(e, (socket.timeout, asyncio.TimeoutError)):
+        return "timed out"
+    return str(e)
+
+def cache_writer(consumer):
+    """The CacheWriter a fetch streams into, directly or behind a TextClassifier."""
+    if isinstance(consumer, TextClassifier):
+        consumer = consumer.sink
+    return consumer if isinstance(consumer, CacheWriter) else None
 
 class GopherCrawler:
-    def __init__(self, host, port=70):
-        self.host = host
+    def __init__(self, host, port=70, concurrency=20, timeout=5, bufsize=DEFAULT_BUFSIZE,
+                 per_server=None, rate=None, queue_report=None,
+                 checkpoint=None, checkpoint_interval=30,
+                 records=None, incremental=False, max_age=None,
+                 cache=None, cache_bytes=256 * 1024 * 1024, cache_ttl=None,
+                 cache_menu_ttl=MENU_TTL,
+                 retries=2, failure_threshold=3, cooldown=30, probe_deadline=3,
+                 shards=None, visited='set', visited_capacity=1_000_000,
+                 visited_error_rate=0.001, listing=None, results=None, results_format=None,
+                 order='dfs', max_depth=None, max_items=None, max_bytes=None, max_time=None,
+                 max_item_bytes=None, max_item_time=None, dns_ttl=300, group_aliases=False,
+                 selector_mode='none', profile=None):
+        self.host = canonical_host(host)
         self.port = port
-        self.visited = set()
-        self.queue = Queue()
+        self.concurrency = concurrency
+        # Worker processes for the 'processes' engine
+        self.shards = shards or os.cpu_count() or 1
+        self.timeout = timeout
+        self.bufsize = bufsize
+        # Adaptive per-server timeouts (capped at self.timeout), retries and
+        # circuit breakers
+        self.health = ServerHealthTracker(timeout, retries=retries,
+                                          failure_threshold=failure_threshold, cooldown=cooldown)
+        # Per item type response caps, overriding the defaults
+        self.max_item_bytes = {**MAX_ITEM_BYTES, **(max_item_bytes or {})}
+        self.max_item_time = {**MAX_ITEM_TIME, **(max_item_time or {})}
+        # Cached, shared name lookups; with group_aliases, names that resolve
+        # to an address already crawled are crawled under the first name
+        self.resolver = Resolver(ttl=dns_ttl)
+        self.aliases = EndpointAliases(self.resolver) if group_aliases else None
+        # 'path' treats selectors starting with "/" as file paths for dedup
+        self.selector_mode = selector_mode
+        # External servers are probed together once the crawl is done
+        self.probe_deadline = probe_deadline
+        # 'set' keeps identifier strings, 'compact' 64-bit fingerprints and
+        # 'bloom' a fixed-size filter that may wrongly skip a few items
+        self.visited = make_visited(visited, visited_capacity, visited_error_rate)
+        # (items, bytes, fullest shard's items, its kind) for the processes engine
+        self.shard_visited = None
+        # The concurrent engines share one frontier that spreads work fairly
+        # across servers and enforces per-server connection and rate limits
+        self.scheduler = PolitenessScheduler(max_in_flight=per_server, rate=rate)
+        self.queue = PoliteQueue(self.scheduler, key=job_server)
+        self.queue_report = queue_report
+        self.last_queue_report = time.monotonic()
+        # Guards visited, stats and the size trackers when worker threads run
+        self.lock = threading.RLock()
+        # Constant-memory aggregates; with a listing directory every path
+        # and error is also written out in full as it is recorded
+        self.listing = listing
+        if listing:
+            os.makedirs(listing, exist_ok=True)
         self.stats = {
             'directories': 0,
-            'text_files': [],
-            'binary_files': [],
-            'errors': [],
+            'text_files': PathSummary(self.listing_file('text_files')),
+            'binary_files': PathSummary(self.listing_file('binary_files')),
+            'errors': ErrorLog(self.listing_file('errors')),
             'external_servers': defaultdict(bool)
         }
         self.smallest_text = {'size': float('inf'), 'content': '', 'path': ''}
         self.largest_text = {'size': 0, 'path': ''}
         self.smallest_binary = {'size': float('inf'), 'path': ''}
         self.largest_binary = {'size': 0, 'path': ''}
+        # Jobs queued or in flight, i.e. the frontier a checkpoint must keep
+        self.pending = set()
+        # The recursive engine's frontier order, and the depth of each of
+        # its pending jobs
+        self.order = order
+        self.depths = {}
+        self.budget = CrawlBudget(max_depth, max_items, max_bytes, max_time)
+        self.gate = CompletionGate()
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint else None
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint = time.monotonic()
+        self.unsaved_visited = []
+        self.resumed_frontier = None
+        # Per-item records from earlier crawls; with incremental set, menus
+        # whose digest hasn't changed are replayed from them instead of
+        # being descended into, and leaves are only re-fetched once older
+        # than max_age seconds
+        self.records = RecordStore(records) if records else None
+        self.incremental = incremental
+        self.max_age = max_age
+        self.cache = (ResponseCache(cache, cache_bytes, cache_ttl, cache_menu_ttl)
+                      if cache else None)
+        # Set by the concurrent engines: menus are parsed as they arrive and
+        # their children queued before the download finishes
+        self.stream_menus = False
+        self.engine = None
+        self.metrics = MetricsRegistry()
+        # cProfile and tracemalloc around the crawl, reported by phase
+        self.profiler = CrawlProfiler(profile) if profile else None
+        self.profile_summary = None  # phase lines from CrawlProfiler.write()
+        # One record per fetched item, written in batches during the crawl
+        self.sink = ResultSink(results, results_format) if results else None
+        # Where process_directory sends discovered children; the async and
+        # threaded engines swap this for a frontier queue
+        self.submit = self.process_item
+        # Set by the async engine: takes items whose host still needs an
+        # alias lookup, which would otherwise block the event loop
+        self.defer_alias = None
+
+    def listing_file(self, name):
+        return os.path.join(self.listing, name + '.txt') if self.listing else None
 
     def log_request(self, selector):
-        print(f"[{time.strftime('%H:%M:%S')}] Requesting: {selector}")
+        with self.lock:
+            print(f"[{time.strftime('%H:%M:%S')}] Requesting: {selector}")
 
-    def fetch_resource(self, host, port, selector):
+    def report_queues(self, top=5):
+        """Print the servers with the deepest pending queues."""
+        depths = self.queue.queue_depths()
+        in_flight = dict(self.scheduler.in_flight)
+        with self.lock:
+            print(f"[{time.strftime('%H:%M:%S')}] Pending: {len(self.scheduler)} "
+                  f"across {len(depths)} servers")
+            for (host, port), depth in list(depths.items())[:top]:
+                print(f"  - {host}:{port}: {depth} queued, {in_flight.get((host, port), 0)} in flight")
+
+    def maybe_report_queues(self):
+        if self.queue_report is None:
+            return
+        now = time.monotonic()
+        if now - self.last_queue_report >= self.queue_report:
+            self.last_queue_report = now
+            self.report_queues()
+
+    def record_error(self, message, host=None, port=None):
+        server = f"{host}:{port}" if host is not None else None
+        with self.lock:
+            self.stats['errors'].append(message, server)
+
+    def transfer_limit(self, item_type):
+        max_bytes = self.max_item_bytes.get(item_type, self.max_item_bytes.get('*'))
+        max_time = self.max_item_time.get(item_type, self.max_item_time.get('*'))
+        if max_bytes is None and max_time is None:
+            return None
+        return TransferLimit(None if max_bytes is None else int(max_bytes), max_time)
+
+    def send_request(self, host, port, selector, consumer=None, timing=None, timeout=None,
+                     limit=None):
+        """
+        Fetch a selector, raising on failure. Returns the response bytes, or
+        when a consumer is given streams the response into it and returns
+        the byte count. Phase durations are filled into timing if given, and
+        a response cut short by limit is marked truncated there.
+        """
+        timing = timing or FetchTiming((host, port), None)
+        address = self.resolver.resolve(host, port)[0]
+        timing.dns = timing.lap()
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout or self.timeout)
+            s.connect(address)
+            timing.connect = timing.lap()
+            s.sendall((selector + "\r\n").encode())
+            wait_for_data(s)
+            timing.ttfb = timing.lap()
+            
+            if consumer is not None:
+                data = timing.bytes = recv_stream(s, consumer, self.bufsize, limit)
+            else:
+                data = recv_all(s, self.bufsize, limit)
+                timing.bytes = len(data)
+            timing.transfer = timing.lap()
+            if limit is not None and limit.truncated:
+                timing.status = 'truncated'
+                timing.truncated = limit.truncated
+            return data
+
+    async def send_request_async(self, host, port, selector, consumer=None, timing=None, timeout=None,
+                                 limit=None):
+        timing = timing or FetchTiming((host, port), None)
+        timeout = timeout or self.timeout
+        addresses = await self.resolver.resolve_async(host, port)
+        timing.dns = timing.lap()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(*addresses[0]), timeout)
+        timing.connect = timing.lap()
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5)
-                s.connect((host, port))
-                s.sendall((selector + "\r\n").encode())
-                
-                data = b""
-                while True:
-                    chunk = s.recv(4096)
-                    if not chunk:
+            writer.write((selector + "\r\n").encode())
+            await writer.drain()
+
+            sink = consumer if consumer is not None else Collector()
+            total = await self.receive_async(reader, sink, timing, timeout, limit)
+            timing.transfer = timing.lap()
+            timing.bytes = total
+            if limit is not None and limit.truncated:
+                timing.status = 'truncated'
+                timing.truncated = limit.truncated
+
+            return total if consumer is not None else bytes(sink.data)
+        finally:
+            writer.close()
+
+    async def receive_async(self, reader, sink, timing, timeout, limit):
+        """Feed a response into sink until the server closes or limit is hit; returns its size."""
+        total = 0
+        if limit is not None:
+            limit.start()
+        while True:
+            if limit is None:
+                chunk = await asyncio.wait_for(reader.read(self.bufsize), timeout)
+            elif limit.expired():
+                break
+            else:
+                try:
+                    chunk = await asyncio.wait_for(
+                        reader.read(limit.room(total, self.bufsize)), limit.wait(timeout))
+                except asyncio.TimeoutError:
+                    if limit.expired():
                         break
-                    data += chunk
-                
-                return data
+                    raise
+                chunk = chunk[:limit.keep(total, len(chunk))]
+            if timing.ttfb is None:
+                timing.ttfb = timing.lap()
+            if chunk:
+                total += len(chunk)
+                sink.feed(chunk)
+            if not chunk or (limit is not None and limit.truncated):
+                break
+        return total
+
+    def fetch_resource(self, host, port, selector, consumer=None):
+        """Like send_request, but records failures as errors and returns None."""
+        try:
+            return self.send_request(host, port, selector, consumer)
         except Exception as e:
-            self.stats['errors'].append(f"Error fetching {selector}: {str(e)}")
+            self.record_error(f"Error fetching {selector}: {describe_error(e)}", host, port)
             return None
 
+    def fetch_item(self, item_type, host, port, selector):
+        """
+        Fetch an item for the engines, retrying transient failures. Returns
+        (data, error, timing), where error is None on success; failures are
+        recorded later by finish_item.
+        """
+        timing = FetchTiming((host, port), item_type)
+        cached = self.cached_item(item_type, host, port, selector)
+        if cached is not None:
+            timing.status = 'cached'
+            return cached, None, timing
+        server = (host, port)
+        attempt = 0
+        while True:
+            if not self.health.allow(server):
+                timing.status = 'short-circuited'
+                return None, f"circuit open for {host}:{port}", timing
+            timing.lap()
+            consumer = self.stream_consumer(item_type, host, port)
+            try:
+                # Retries get the full timeout in case the adaptive one was too tight
+                timeout = self.health.timeout_for(server) if attempt == 0 else self.timeout
+                limit = self.transfer_limit(item_type)
+                if consumer is not None:
+                    self.send_request(host, port, selector, consumer, timing, timeout, limit)
+                    data = self.stream_done(consumer, host, port, selector, timing)
+                else:
+                    data = self.send_request(host, port, selector, timing=timing, timeout=timeout,
+                                             limit=limit)
+                    data = self.cache_item(data, host, port, selector, timing)
+                self.health.success(server, timing.connect + timing.ttfb)
+                return data, None, timing
+            except Exception as e:
+                writer = cache_writer(consumer)
+                if writer is not None:
+                    writer.discard()
+                if not self.health.should_retry(server, e, attempt):
+                    # Only the final failure of an item counts towards the breaker
+                    self.health.failure(server)
+                    timing.status = 'error'
+                    return None, describe_error(e), timing
+                time.sleep(self.health.retry_delay(attempt))
+                attempt += 1
+
+    async def fetch_item_async(self, item_type, host, port, selector):
+        timing = FetchTiming((host, port), item_type)
+        cached = self.cached_item(item_type, host, port, selector)
+        if cached is not None:
+            timing.status = 'cached'
+            return cached, None, timing
+        server = (host, port)
+        attempt = 0
+        while True:
+            if not self.health.allow(server):
+                timing.status = 'short-circuited'
+                return None, f"circuit open for {host}:{port}", timing
+            timing.lap()
+            consumer = self.stream_consumer(item_type, host, port)
+            try:
+                # Retries get the full timeout in case the adaptive one was too tight
+                timeout = self.health.timeout_for(server) if attempt == 0 else self.timeout
+                limit = self.transfer_limit(item_type)
+                if consumer is not None:
+                    await self.send_request_async(host, port, selector, consumer, timing, timeout,
+                                                  limit)
+                    data = self.stream_done(consumer, host, port, selector, timing)
+                else:
+                    data = await self.send_request_async(host, port, selector, timing=timing,
+                                                         timeout=timeout, limit=limit)
+                    data = self.cache_item(data, host, port, selector, timing)
+                self.health.success(server, timing.connect + timing.ttfb)
+                return data, None, timing
+            except Exception as e:
+                writer = cache_writer(consumer)
+                if writer is not None:
+                    writer.discard()
+                if not self.health.should_retry(server, e, attempt):
+                    # Only the final failure of an item counts towards the breaker
+                    self.health.failure(server)
+                    timing.status = 'error'
+                    return None, describe_error(e), timing
+                await asyncio.sleep(self.health.retry_delay(attempt))
+                attempt += 1
+
+    def stream_consumer(self, item_type, host, port):
+        """Consumer to stream an item through, or None to buffer the whole response."""
+        if item_type == '1':
+            if not self.stream_menus:
+                return None
+            keep = self.cache is not None or self.records is not None
+            return MenuStreamParser(host, port, self.dispatch_streamed, keep=keep,
+                                    on_batch=self.prefetch)
+        if item_type == '0':
+            # Validated as it arrives, keeping only the sample
+            sink = self.cache.writer() if self.cache is not None else None
+            return TextClassifier(sink=sink)
+        if item_type in ('I', '9'):
+            # Binary items only contribute their size (and digest, when
+            # keeping records), so never hold them in memory
+            if self.cache is not None:
+                return self.cache.writer()
+            return DigestCounter() if self.records is not None else SizeCounter()
+        return None
+
+    def stream_done(self, consumer, host, port, selector, timing):
+        if isinstance(consumer, MenuStreamParser):
+            consumer.close()
+            if self.cache is not None and not timing.truncated:
+                self.cache.put(host, port, selector, bytes(consumer.data))
+            return consumer
+        if isinstance(consumer, TextClassifier):
+            # A character cut in two by a truncated transfer isn't an error
+            consumer.close(final=not timing.truncated)
+            if consumer.sink is not None:
+                self.cache_item(consumer.sink, host, port, selector, timing)
+            return consumer
+        return self.cache_item(consumer, host, port, selector, timing)
+
+    def dispatch_streamed(self, item):
+        # Children of a menu still downloading are part of the state a
+        # checkpoint saves, so dispatch each one as a completion of its own
+        with self.gate.completing():
+            self.dispatch(*item)
+
+    def cached_item(self, item_type, host, port, selector):
+        if self.cache is None:
+            return None
+        if item_type in ('I', '9'):
+            return self.cache.get_blob(host, port, selector, item_type)
+        return self.cache.get(host, port, selector, item_type)
+
+    def cache_item(self, data, host, port, selector, timing):
+        if self.cache is not None:
+            if timing.truncated:
+                # Never serve a cut-short response as the real thing
+                if isinstance(data, CacheWriter):
+                    data.discard()
+            elif isinstance(data, bytes):
+                self.cache.put(host, port, selector, data)
+            else:
+                self.cache.commit(data, host, port, selector)
+        return data
+
     def is_text_file(self, data):
-        try:
-            data.decode('utf-8')
-            return True
-        except UnicodeDecodeError:
-            return False
+        return classify(data).binary is None
 
-    def process_item(self, item_type, description, selector, host, port):
-        identifier = f"{item_type}{selector}@{host}:{port}"
-        if identifier in self.visited:
-            return
-        
-        self.visited.add(identifier)
+    def visit(self, item_type, selector, host, port):
+        """Mark an item as seen; returns False if it was already visited."""
+        with self.lock:
+            if not self.visited.add(item_type, selector, host, port):
+                return False
+            if self.checkpoint:
+                self.unsaved_visited.append(item_id(item_type, selector, host, port))
+        return True
+
+    def begin_item(self, item_type, selector, host, port):
+        """
+        Handle items that need no fetch; returns True if the item needs
+        fetching, in which case finish_item completes it.
+        """
         full_path = selector if selector else "/"
-        
-        if item_type == '1':  # Directory
-            self.stats['directories'] += 1
-            self.log_request(full_path)
-            data = self.fetch_resource(host, port, selector)
-            if data:
-                self.process_directory(data, host, port)
-        
-        elif item_type == '0':  # Text file
-            self.log_request(full_path)
-            data = self.fetch_resource(host, port, selector)
-            if data:
-                self.process_text_file(data, full_path)
-        
-        elif item_type in ['I', '9']:  # Binary file
+
+        if item_type in FETCHED_TYPES:
             self.log_request(full_path)
-            data = self.fetch_resource(host, port, selector)
-            if data:
-                self.process_binary_file(data, full_path)
-        
-        elif item_type == '3':  # Error
-            self.stats['errors'].append(f"Error item: {full_path}")
-        
+            return True
+
+        if item_type == '3':  # Error
+            self.record_error(f"Error item: {full_path}", host, port)
+
         elif item_type == 'h':  # HTML (external)
             if host != self.host or port != self.port:
                 self.check_external_server(host, port)
+        return False
 
-    def process_directory(self, data, host, port):
-        try:
-            lines = data.decode('utf-8').split('\r\n')
-            for line in lines:
-                if not line:
-                    continue
-                
-                parts = line.split('\t')
-                if len(parts) < 4:
-                    continue
-                
-                item_type = parts[0][0]
-                description = parts[0][1:].strip()
-                selector = parts[1]
-                item_host = parts[2] if parts[2] else host
-                item_port = int(parts[3]) if parts[3] else port
-                
-                self.process_item(item_type, description, selector, item_host, item_port)
-        except UnicodeDecodeError:
-            self.stats['errors'].append("Invalid directory encoding")
-
-    def process_text_file(self, data, path):
-        try:
-            content = data.decode('utf-8')
-            size = len(data)
-            
-            self.stats['text_files'].append(path)
+    def handle_response(self, item_type, data, host, port, selector, truncated=False):
+        """
+        Process a fetch_item() result: bytes or a MenuStreamParser for menus,
+        a TextClassifier (or cached bytes) for text, a counter for binaries.
+        A truncated response is counted, but its size is left out of the
+        stats and it gets no record, so the next crawl fetches it again.
+        """
+        full_path = selector if selector else "/"
+        key = item_id(item_type, selector, host, port)
+        records = self.records if not truncated else None
+
+        if item_type == '1':
+            if isinstance(data, MenuStreamParser):
+                # Children were dispatched while the menu downloaded
+                if data.encoding_errors:
+                    self.record_error("Invalid directory encoding", host, port)
+                if records is not None:
+                    with self.lock:
+                        records.put(key, item_type, data.size, data.hexdigest(),
+                                    children=data.children)
+                return
+            if records is None:
+                self.process_directory(data, host, port)
+                return
+            digest = content_digest(data)
+            with self.lock:
+                record = records.get(key)
+            if (self.incremental and record and record['digest'] == digest
+                    and record['children'] is not None):
+                with self.lock:
+                    records.touch(key)
+                self.replay_menu(record['children'])
+                return
+            children = []
+            self.process_directory(data, host, port, children)
+            with self.lock:
+                records.put(key, item_type, len(data), digest, children=children)
+
+        elif item_type == '0':
+            if not isinstance(data, TextClassifier):
+                # Served from the cache as bytes
+                data = classify(data)
+            sample = self.process_text_file(data, full_path, truncated)
+            if sample is not None and records is not None:
+                with self.lock:
+                    records.put(key, item_type, data.size, data.hexdigest(), sample=sample)
+
+        else:
+            self.process_binary_file(len(data), full_path, truncated)
+            if records is not None:
+                with self.lock:
+                    records.put(key, item_type, len(data), data.hexdigest())
+
+    def is_stale(self, record):
+        return self.max_age is not None and time.time() - record['fetched_at'] > self.max_age
+
+    def fresh_record(self, item_type, selector, host, port):
+        """The stored record for an item if it may be reused, otherwise None."""
+        if not self.incremental or item_type not in FETCHED_TYPES:
+            return None
+        with self.lock:
+            record = self.records.get(item_id(item_type, selector, host, port))
+        if record is None or self.is_stale(record):
+            return None
+        return record
+
+    def canonical(self, item_type, host, port, selector):
+        """The (host, selector) an item is deduplicated and fetched under."""
+        host = canonical_host(host)
+        if self.aliases is not None and item_type in CONTACTED_TYPES:
+            host = self.aliases.canonical(host, port)
+        return host, normalize_selector(selector, self.selector_mode)
+
+    def prefetch(self, items):
+        """Resolve the servers a menu lists together, before its items are dispatched."""
+        self.resolver.prefetch((canonical_host(item[3]), item[4]) for item in items
+                               if item[0] in CONTACTED_TYPES)
+
+    def dispatch(self, item_type, description, selector, host, port):
+        """Pass a discovered item to the engine, unless its stored record is still fresh."""
+        if (self.defer_alias is not None and self.aliases is not None
+                and item_type in CONTACTED_TYPES
+                and not self.aliases.known(canonical_host(host), port)):
+            self.defer_alias(item_type, description, selector, host, port)
+            return
+        host, selector = self.canonical(item_type, host, port, selector)
+        self.dispatch_canonical(item_type, description, selector, host, port)
+
+    def dispatch_canonical(self, item_type, description, selector, host, port):
+        # Menus listed by a changed menu are always fetched to check their digest
+        if item_type != '1':
+            record = self.fresh_record(item_type, selector, host, port)
+            if record is not None:
+                if self.visit(item_type, selector, host, port):
+                    self.apply_record(record, selector)
+                return
+        self.submit(item_type, description, selector, host, port)
+
+    def apply_record(self, record, selector):
+        full_path = selector if selector else "/"
+        if record['item_type'] == '0':
+            self.record_text_file(record['size'], full_path, record['sample'])
+        else:
+            self.process_binary_file(record['size'], full_path)
+
+    def replay_menu(self, children):
+        """
+        Dispatch an unchanged menu's children again. Leaves with a fresh
+        record are counted from it, but submenus are always fetched, since
+        only their own digest shows whether they changed.
+        """
+        self.prefetch(children)
+        for child in children:
+            self.dispatch(*child)
+
+    def finish_item(self, job, data, error, timing=None):
+        """
+        Apply everything a fetched job contributes to the crawl state in one
+        step, so a checkpoint never sees a job half done.
+        """
+        item_type, selector, host, port = job
+        with self.gate.completing():
+            try:
+                if item_type == '1':  # Directory
+                    with self.lock:
+                        self.stats['directories'] += 1
+                if error is not None:
+                    self.record_error(f"Error fetching {selector}: {error}", host, port)
+                elif data:
+                    if timing is not None:
+                        timing.lap()
+                    self.handle_response(item_type, data, host, port, selector,
+                                         truncated=timing is not None and bool(timing.truncated))
+                    if timing is not None:
+                        timing.process = timing.lap()
+                if timing is not None and timing.truncated:
+                    # What arrived was still processed
+                    self.record_error(f"Truncated {selector}: {timing.truncated}, "
+                                      f"kept {timing.bytes} bytes", host, port)
+            finally:
+                with self.lock:
+                    self.pending.discard(job)
+                if timing is not None:
+                    self.budget.spend(timing.bytes)
+                    self.metrics.record(timing)
+                    if self.sink is not None:
+                        self.sink.record(item_type, selector, host, port, timing, error)
+
+    def process_item(self, item_type, description, selector, host, port):
+        if not self.visit(item_type, selector, host, port):
+            return
+
+        if self.begin_item(item_type, selector, host, port):
+            data, error, timing = self.fetch_item(item_type, host, port, selector)
+            self.finish_item((item_type, selector, host, port), data, error, timing)
+
+    def process_directory(self, data, host, port, children=None):
+        items = []
+        _, _, encoding_errors = parse_lines(data, host, port, items)
+        if encoding_errors:
+            self.record_error("Invalid directory encoding", host, port)
+        self.prefetch(items)
+        for child in items:
+            if children is not None:
+                children.append(child)
+            self.dispatch(*child)
+
+    def process_text_file(self, data, path, truncated=False):
+        """
+        Record a classified text item. Returns the sample kept for the file,
+        or None if it isn't text.
+        """
+        if data.binary == "invalid UTF-8":
+            self.record_error(f"Text file decoding failed: {path}")
+            return None
+        if data.binary is not None:
+            self.record_error(f"Text file is binary ({data.binary}): {path}")
+            return None
+        self.record_text_file(data.size, path, data.sample, truncated)
+        return data.sample
+
+    def record_text_file(self, size, path, sample, truncated=False):
+        with self.lock:
+            if truncated:
+                # Only part of the file arrived, so its size means nothing
+                self.stats['text_files'].append(path)
+                return
+            self.stats['text_files'].append(path, size)
             
             if size < self.smallest_text['size']:
                 self.smallest_text = {
                     'size': size,
-                    'content': content[:1000],  # Only keep first 1000 chars
+                    'content': sample,
                     'path': path
                 }
             
@@ -133,59 +691,506 @@ class GopherCrawler:
                     'size': size,
                     'path': path
                 }
-        except UnicodeDecodeError:
-            self.stats['errors'].append(f"Text file decoding failed: {path}")
 
-    def process_binary_file(self, data, path):
-        size = len(data)
-        self.stats['binary_files'].append(path)
-        
-        if size < self.smallest_binary['size']:
-            self.smallest_binary = {
-                'size': size,
-                'path': path
-            }
-        
-        if size > self.largest_binary['size']:
-            self.largest_binary = {
-                'size': size,
-                'path': path
-            }
+    def process_binary_file(self, size, path, truncated=False):
+        with self.lock:
+            if truncated:
+                self.stats['binary_files'].append(path)
+                return
+            self.stats['binary_files'].append(path, size)
+            
+            if size < self.smallest_binary['size']:
+                self.smallest_binary = {
+                    'size': size,
+                    'path': path
+                }
+            
+            if size > self.largest_binary['size']:
+                self.largest_binary = {
+                    'size': size,
+                    'path': path
+                }
 
     def check_external_server(self, host, port):
-        key = f"{host}:{port}"
-        if key not in self.stats['external_servers']:
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.settimeout(3)
-                    s.connect((host, port))
-                    self.stats['external_servers'][key] = True
-            except:
-                self.stats['external_servers'][key] = False
-
-    def crawl(self):
+        """Note an external server; probe_external_servers() checks it later."""
+        with self.lock:
+            self.stats['external_servers'].setdefault(f"{host}:{port}", False)
+
+    def probe_external_servers(self):
+        """Check every noted external server at once, under one deadline."""
+        endpoints = {}
+        for key in self.stats['external_servers']:
+            host, port = key.rsplit(':', 1)
+            endpoints[key] = (host, int(port))
+        if not endpoints:
+            return
+        reachable = probe_endpoints(endpoints.values(), self.probe_deadline,
+                                    resolver=self.resolver)
+        with self.lock:
+            for key, endpoint in endpoints.items():
+                self.stats['external_servers'][key] = reachable[endpoint]
+
+    def crawl(self, engine='recursive', resume=False):
+        if engine != 'recursive' and (self.budget.max_depth is not None or self.order != 'dfs'):
+            raise ValueError("depth limits and frontier orders need the recursive engine")
+        if engine == 'processes' and (self.checkpoint or self.records is not None or self.cache
+                                      or self.budget):
+            raise ValueError("the processes engine can't share a checkpoint, records, cache "
+                             "or budget")
+        if engine == 'processes' and self.aliases is not None:
+            # Each shard would group names in its own order
+            raise ValueError("the processes engine can't group address aliases")
+        if engine == 'processes' and self.profiler is not None:
+            raise ValueError("the processes engine can't be profiled; use threads instead")
+        if engine == 'processes' and (self.scheduler.max_in_flight is not None
+                                      or self.scheduler.rate is not None
+                                      or self.queue_report is not None):
+            # A server's items are spread over every shard, so no one
+            # scheduler sees all its connections
+            raise ValueError("the processes engine can't apply per-server limits")
+
         print(f"Starting crawl of gopher://{self.host}:{self.port}")
         start_time = time.time()
+        self.engine = engine
+        if self.aliases is not None:
+            # The root's name wins over any alias the crawl finds for it
+            self.aliases.canonical(self.host, self.port)
+        self.budget.start()
+        if resume:
+            self.resume()
+        else:
+            if self.checkpoint:
+                self.checkpoint.reset()
+            if self.listing:
+                # Listings are appended to, so start a fresh crawl's empty
+                for name in ('text_files', 'binary_files', 'errors'):
+                    open(self.listing_file(name), 'w').close()
+        if self.sink is not None and engine != 'processes':
+            # Shards write files of their own
+            self.sink.open(append=resume)
+        if self.profiler is not None:
+            self.profiler.start()
         
-        # Start with root directory
-        self.process_item('1', 'Root', '', self.host, self.port)
+        try:
+            if engine == 'async':
+                asyncio.run(self.crawl_async())
+            elif engine == 'threads':
+                self.crawl_threaded()
+            elif engine == 'processes':
+                self.crawl_sharded()
+            else:
+                self.crawl_frontier()
+            self.probe_external_servers()
+        except KeyboardInterrupt:
+            if self.checkpoint:
+                self.save_checkpoint()
+                print(f"\nInterrupted; progress saved to {self.checkpoint.path}")
+            raise
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+            self.resolver.close()
+            if self.profiler is not None:
+                # Never leave the trace hooks installed, even on failure
+                self.profiler.stop()
+        if self.profiler is not None:
+            self.profile_summary = self.profiler.write()
+        if self.budget.stopped:
+            print(f"\nStopped early: {self.budget.stopped}; "
+                  f"{len(self.pending)} items left unfetched")
+        if self.checkpoint:
+            # A budgeted crawl can be resumed for more
+            self.save_checkpoint(complete=not self.budget.stopped)
+        if self.records is not None:
+            self.records.commit()
+        if self.cache is not None:
+            self.cache.save()
+        if self.listing:
+            self.write_listing_report()
         
         print("\n=== Crawl Complete ===")
         print(f"Time taken: {time.time() - start_time:.2f} seconds")
         self.print_summary()
 
+    def write_listing_report(self):
+        """Close the listings and save the aggregates beside them as stats.json."""
+        for name in ('text_files', 'binary_files', 'errors'):
+            if self.stats[name].listing is not None:
+                self.stats[name].listing.close()
+        report = {
+            'directories': self.stats['directories'],
+            'text_files': self.stats['text_files'].report(),
+            'binary_files': self.stats['binary_files'].report(),
+            'errors': self.stats['errors'].report(),
+        }
+        with open(os.path.join(self.listing, 'stats.json'), 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def snapshot_stats(self):
+        stats = dict(self.stats)
+        for name in ('text_files', 'binary_files', 'errors'):
+            stats[name] = self.stats[name].to_dict()
+        return {
+            'stats': stats,
+            'smallest_text': self.smallest_text,
+            'largest_text': self.largest_text,
+            'smallest_binary': self.smallest_binary,
+            'largest_binary': self.largest_binary,
+        }
+
+    def restore_stats(self, snapshot):
+        stats = snapshot['stats']
+        self.stats['directories'] = stats['directories']
+        for name in ('text_files', 'binary_files', 'errors'):
+            self.stats[name].from_dict(stats[name])
+        self.stats['external_servers'] = defaultdict(bool, stats['external_servers'])
+        self.smallest_text = snapshot['smallest_text']
+        self.largest_text = snapshot['largest_text']
+        self.smallest_binary = snapshot['smallest_binary']
+        self.largest_binary = snapshot['largest_binary']
+
+    def save_checkpoint(self, complete=False):
+        # Wait for in-progress jobs to finish updating the state
+        with self.gate.quiesce(), self.lock:
+            if self.records is not None:
+                self.records.commit()
+            # Round-trip through JSON so sqlite gets a consistent copy
+            stats = json.loads(json.dumps(self.snapshot_stats()))
+            frontier = [job + (self.depths[job],) if job in self.depths else job
+                        for job in self.pending]
+            self.checkpoint.save(self.unsaved_visited, frontier, stats, complete)
+            self.unsaved_visited = []
+            self.last_checkpoint = time.monotonic()
+
+    def maybe_checkpoint(self):
+        if self.checkpoint and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def resume(self):
+        """Restore visited items, stats and the pending frontier from the checkpoint."""
+        saved = self.checkpoint.load() if self.checkpoint else None
+        if saved is None:
+            print("No checkpoint to resume from; starting a fresh crawl")
+            return
+        visited, frontier, stats = saved
+        for identifier in visited:
+            self.visited.add(*split_item_id(identifier))
+        self.restore_stats(stats)
+        self.resumed_frontier = frontier
+        print(f"Resuming: {len(visited)} items visited, {len(frontier)} pending")
+
+    def seed(self, submit, enqueue):
+        """Start an engine from the resumed frontier, or from the root menu."""
+        if self.resumed_frontier is not None:
+            # Jobs saved by the recursive engine carry their depth too
+            for job in self.resumed_frontier:
+                enqueue(tuple(job[:4]), *job[4:])
+        else:
+            submit('1', 'Root', '', self.host, self.port)
+
+    def crawl_frontier(self):
+        """
+        The recursive engine: fetch one item at a time from an explicit
+        frontier in self.order, within self.budget.
+        """
+        frontier = Frontier(self.order)
+        children = []
+        depth = -1  # of the item being finished; the root is at 0
+
+        def enqueue(job, depth=0):
+            with self.lock:
+                self.pending.add(job)
+            self.depths[job] = depth
+            frontier.extend([job], depth)
+
+        def submit(item_type, description, selector, host, port):
+            # Checked before visiting, so the item can still be fetched if
+            # it turns up again higher in the tree
+            if not self.budget.allows_depth(depth + 1):
+                return
+            if not self.visit(item_type, selector, host, port):
+                return
+            if item_type not in FETCHED_TYPES:
+                self.begin_item(item_type, selector, host, port)
+                return
+            children.append((item_type, selector, host, port))
+
+        def queue_children():
+            with self.lock:
+                self.pending.update(children)
+            for job in children:
+                self.depths[job] = depth + 1
+            frontier.extend(children, depth + 1)
+            children.clear()
+
+        self.submit = submit
+        try:
+            self.seed(submit, enqueue)
+            queue_children()
+            while frontier:
+                job, depth = frontier.pop()
+                if not self.budget.admit():
+                    break
+                item_type, selector, host, port = job
+                try:
+                    self.begin_item(item_type, selector, host, port)
+                    data, error, timing = self.fetch_item(item_type, host, port, selector)
+                    self.finish_item(job, data, error, timing)
+                except Exception as e:
+                    self.record_error(f"Error processing {selector}: {str(e)}", host, port)
+                self.depths.pop(job, None)
+                queue_children()
+                self.maybe_checkpoint()
+        finally:
+            self.submit = self.process_item
+
+    async def crawl_async(self):
+        """Crawl with up to self.concurrency fetches in flight at once."""
+        wake = asyncio.Event()
+        # Items waiting for an alias lookup; they aren't pending jobs yet,
+        # so no checkpoint is taken while there are any
+        resolving = set()
+
+        def enqueue(job, depth=0):
+            with self.lock:
+                self.pending.add(job)
+            self.scheduler.push(job_server(job), job)
+            wake.set()
+
+        def submit(item_type, description, selector, host, port):
+            if not self.visit(item_type, selector, host, port):
+                return
+            if item_type not in FETCHED_TYPES:
+                # Nothing to fetch, so don't spend a server's rate budget on it
+                self.begin_item(item_type, selector, host, port)
+                return
+            enqueue((item_type, selector, host, port))
+
+        async def resolve_alias(item_type, description, selector, host, port):
+            try:
+                host = await self.aliases.canonical_async(canonical_host(host), port)
+                with self.gate.completing():
+                    self.dispatch_canonical(item_type, description,
+                                            normalize_selector(selector, self.selector_mode),
+                                            host, port)
+            except Exception as e:
+                self.record_error(f"Error processing {selector}: {str(e)}", host, port)
+            finally:
+                # Before waking the workers, which stop once nothing is left
+                resolving.discard(asyncio.current_task())
+                wake.set()
+
+        def defer_alias(*item):
+            resolving.add(asyncio.ensure_future(resolve_alias(*item)))
+
+        async def worker():
+            while True:
+                key, job, wait = self.scheduler.pop()
+                if job is None:
+                    if (not len(self.scheduler) and not self.scheduler.in_flight_total()
+                            and not resolving):
+                        return
+                    # Sleep until a fetch finishes, new work arrives or a
+                    # rate-limited server gets a token
+                    wake.clear()
+                    try:
+                        await asyncio.wait_for(wake.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                item_type, selector, host, port = job
+                if not self.budget.admit():
+                    # Out of budget: drain the queue, leaving jobs pending
+                    # for a checkpoint
+                    self.scheduler.release(key)
+                    continue
+                try:
+                    self.begin_item(item_type, selector, host, port)
+                    data, error, timing = await self.fetch_item_async(item_type, host, port, selector)
+                    self.finish_item(job, data, error, timing)
+                except Exception as e:
+                    self.record_error(f"Error processing {selector}: {str(e)}", host, port)
+                finally:
+                    self.scheduler.release(key)
+                    wake.set()
+                self.maybe_report_queues()
+                if not resolving:
+                    self.maybe_checkpoint()
+
+        self.submit = submit
+        self.defer_alias = defer_alias
+        # Incremental mode needs a menu's full digest before deciding to descend
+        self.stream_menus = not self.incremental
+        try:
+            self.seed(submit, enqueue)
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            self.submit = self.process_item
+            self.defer_alias = None
+            self.stream_menus = False
+
+    def crawl_threaded(self):
+        """Crawl with self.concurrency worker threads pulling jobs from self.queue."""
+        done = threading.Event()
+
+        def enqueue(job, depth=0):
+            with self.lock:
+                self.pending.add(job)
+            self.queue.put(job)
+
+        def submit(item_type, description, selector, host, port):
+            if not self.visit(item_type, selector, host, port):
+                return
+            if item_type not in FETCHED_TYPES:
+                self.begin_item(item_type, selector, host, port)
+                return
+            enqueue((item_type, selector, host, port))
+
+        def worker():
+            while not done.is_set():
+                try:
+                    job = self.queue.get(timeout=0.1)
+                except Empty:
+                    continue
+                item_type, selector, host, port = job
+                if not self.budget.admit():
+                    self.queue.release(job)
+                    self.queue.task_done()
+                    continue
+                try:
+                    self.begin_item(item_type, selector, host, port)
+                    data, error, timing = self.fetch_item(item_type, host, port, selector)
+                    self.finish_item(job, data, error, timing)
+                except Exception as e:
+                    self.record_error(f"Error processing {selector}: {str(e)}", host, port)
+                finally:
+                    self.queue.release(job)
+                    self.queue.task_done()
+                self.maybe_report_queues()
+                self.maybe_checkpoint()
+
+        self.submit = submit
+        self.stream_menus = not self.incremental
+        try:
+            self.seed(submit, enqueue)
+            threads = [threading.Thread(target=self.thread_target(worker), daemon=True)
+                       for _ in range(self.concurrency)]
+            for t in threads:
+                t.start()
+            # The frontier has drained once every queued job is marked done
+            self.queue.join()
+        finally:
+            done.set()
+            self.submit = self.process_item
+            self.stream_menus = False
+
+    def thread_target(self, target):
+        # cProfile only sees the thread that enables it
+        return self.profiler.wrap(target) if self.profiler is not None else target
+
+    def crawl_sharded(self):
+        """Crawl with self.shards processes, each owning a hash partition of the items."""
+        def item_key(item):
+            item_type, description, selector, host, port = item
+            return item_id(item_type, selector, host, port)
+
+        results = run_shards(self.crawl_shard, self.shards, item_key,
+                             ('1', 'Root', '', self.host, self.port))
+        for result in results:
+            self.merge_shard(result)
+
+    def crawl_shard(self, shard, router):
+        """
+        Runs in a shard's process: fetch the items routed to this shard,
+        routing discovered links to their owners. Returns this shard's
+        stats, metrics, server health and lookup counts for merge_shard().
+        """
+        def submit(item_type, description, selector, host, port):
+            router.route((item_type, description, selector, host, port))
+
+        def worker():
+            while True:
+                item = router.get(shard)
+                if item is None:
+                    if router.finished():
+                        return
+                    continue
+                item_type, description, selector, host, port = item
+                try:
+                    # The owning shard is the only one that sees an item, so
+                    # its visited set is enough to dedupe it
+                    if (self.visit(item_type, selector, host, port)
+                            and self.begin_item(item_type, selector, host, port)):
+                        data, error, timing = self.fetch_item(item_type, host, port, selector)
+                        self.finish_item((item_type, selector, host, port), data, error, timing)
+                except Exception as e:
+                    self.record_error(f"Error processing {selector}: {str(e)}", host, port)
+                finally:
+                    # Children were routed by now, so the count can't hit
+                    # zero while there is still work
+                    router.task_done()
+
+        self.submit = submit
+        self.stream_menus = True
+        if self.sink is not None:
+            self.sink = self.sink.for_shard(shard)
+        threads = [threading.Thread(target=worker, daemon=True)
+                   for _ in range(max(1, self.concurrency // self.shards))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self.sink is not None:
+            self.sink.close()
+        return {
+            'stats': self.snapshot_stats(),
+            'metrics': self.metrics.export(),
+            'health': self.health.servers,
+            'resolver': self.resolver.export(),
+            'visited': (len(self.visited), self.visited.memory_bytes(), self.visited.kind),
+        }
+
+    def merge_shard(self, result):
+        snapshot = result['stats']
+        stats = snapshot['stats']
+        self.stats['directories'] += stats['directories']
+        for name in ('text_files', 'binary_files'):
+            self.stats[name].merge(PathSummary().from_dict(stats[name]))
+        self.stats['errors'].merge(ErrorLog().from_dict(stats['errors']))
+        for key, up in stats['external_servers'].items():
+            self.stats['external_servers'][key] |= up
+        if snapshot['smallest_text']['size'] < self.smallest_text['size']:
+            self.smallest_text = snapshot['smallest_text']
+        if snapshot['largest_text']['size'] > self.largest_text['size']:
+            self.largest_text = snapshot['largest_text']
+        if snapshot['smallest_binary']['size'] < self.smallest_binary['size']:
+            self.smallest_binary = snapshot['smallest_binary']
+        if snapshot['largest_binary']['size'] > self.largest_binary['size']:
+            self.largest_binary = snapshot['largest_binary']
+        self.metrics.merge(result['metrics'])
+        self.health.merge(result['health'])
+        self.resolver.merge(result['resolver'])
+        count, size, kind = result['visited']
+        items, total, fullest, kind_shown = self.shard_visited or (0, 0, -1, kind)
+        # The shards' filters are the same size, so the fullest has the
+        # highest false-positive rate
+        if count > fullest:
+            fullest, kind_shown = count, kind
+        self.shard_visited = (items + count, total + size, fullest, kind_shown)
+
     def print_summary(self):
         print("\n=== Summary ===")
         print(f"Directories: {self.stats['directories']}")
         
         print(f"\nText files ({len(self.stats['text_files'])}):")
-        for f in sorted(self.stats['text_files'])[:10]:  # Show first 10
+        for f in self.stats['text_files'].first:  # First 10 in sorted order
             print(f"  - {f}")
         if len(self.stats['text_files']) > 10:
             print(f"  ... and {len(self.stats['text_files']) - 10} more")
         
         print(f"\nBinary files ({len(self.stats['binary_files'])}):")
-        for f in sorted(self.stats['binary_files'])[:10]:
+        for f in self.stats['binary_files'].first:
             print(f"  - {f}")
         if len(self.stats['binary_files']) > 10:
             print(f"  ... and {len(self.stats['binary_files']) - 10} more")
@@ -201,18 +1206,187 @@ class GopherCrawler:
         if self.largest_binary['path']:
             print(f"Largest binary file: {self.largest_binary['path']} ({self.largest_binary['size']} bytes)")
         
+        print(f"\nFetch timing ({self.metrics.summary()})")
+        if self.shard_visited:
+            items, size, _, kind = self.shard_visited
+        else:
+            items, size, kind = len(self.visited), self.visited.memory_bytes(), self.visited.kind
+        print(f"Visited set ({kind}): {items} items in {size / 1024:.1f} KiB")
+        print(f"DNS cache: {self.resolver.summary()}")
+        if self.aliases is not None and self.aliases.merged:
+            print(f"Address aliases merged: {self.aliases.merged}")
+        
+        if self.cache is not None:
+            print(f"\nResponse cache: {self.cache.summary()}")
+        
         print("\nExternal servers:")
         for server, status in self.stats['external_servers'].items():
             print(f"  - {server}: {'UP' if status else 'DOWN'}")
         
         if self.stats['errors']:
             print("\nErrors encountered:")
-            for error in self.stats['errors'][:5]:  # Show first 5 errors
+            for error in self.stats['errors'].first:  # First 5 errors
                 print(f"  - {error}")
             if len(self.stats['errors']) > 5:
                 print(f"  ... and {len(self.stats['errors']) - 5} more")
+        
+        unhealthy = self.health.report()
+        if unhealthy:
+            print("\nServer health (retries and circuit breakers):")
+            for line in unhealthy:
+                print(f"  - {line}")
+        
+        if self.profile_summary is not None:
+            print("\nProfile by phase (thread-seconds, memory still allocated):")
+            for line in self.profile_summary:
+                print(f"  {line}")
+            prefix = self.profiler.prefix
+            print(f"Profile written to {prefix}.pstats and {prefix}.txt")
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a Gopher server and summarise its contents.")
+    parser.add_argument("host", nargs="?", default="comp3310.ddns.net")
+    parser.add_argument("port", nargs="?", type=int, default=70)
+    parser.add_argument("--engine", choices=["recursive", "async", "threads", "processes"],
+                        default="recursive", help="crawl engine (default: recursive)")
+    parser.add_argument("--visited", choices=["set", "compact", "bloom"], default="set",
+                        help="visited-set backend: identifier strings, compact 64-bit "
+                             "fingerprints, or a Bloom filter (default: set)")
+    parser.add_argument("--visited-capacity", type=int, default=1_000_000,
+                        help="items the Bloom filter is sized for")
+    parser.add_argument("--visited-error-rate", type=float, default=0.001,
+                        help="Bloom filter false-positive rate at capacity")
+    parser.add_argument("--listing", metavar="DIR",
+                        help="write every text file, binary file and error to DIR, "
+                             "with size histograms and the largest files in stats.json")
+    parser.add_argument("--results", metavar="PATH",
+                        help="write a record per fetched item to PATH as the crawl runs "
+                             "(.jsonl or .csv, add .gz to compress)")
+    parser.add_argument("--results-format", choices=["jsonl", "csv"],
+                        help="format of --results (default: from its extension)")
+    parser.add_argument("--order", choices=["dfs", "bfs", "priority"], default="dfs",
+                        help="frontier order for the recursive engine; priority fetches "
+                             "menus, then text, then other files (default: dfs)")
+    parser.add_argument("--max-depth", type=int,
+                        help="deepest menu level to crawl, the root being 0 (recursive engine)")
+    parser.add_argument("--max-items", type=int, help="stop after starting this many fetches")
+    parser.add_argument("--max-bytes", type=int, help="stop once this many bytes are downloaded")
+    parser.add_argument("--max-time", type=float, metavar="SECONDS",
+                        help="stop starting new fetches after this long")
+    parser.add_argument("--max-item-bytes", type=parse_caps, metavar="TYPE=BYTES,...",
+                        help="cap on a single response by item type, '*' for the rest and "
+                             "'none' for no cap (default: 1=16MiB,0=64MiB)")
+    parser.add_argument("--max-item-time", type=parse_caps, metavar="TYPE=SECONDS,...",
+                        help="cap on a single transfer's total time (default: *=300)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="worker processes for the processes engine (default: CPU count)")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="maximum fetches in flight (async tasks or worker threads)")
+    parser.add_argument("--timeout", type=float, default=5,
+                        help="socket timeout in seconds; the ceiling for adaptive per-server timeouts")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="retries after a transient failure, with jittered backoff")
+    parser.add_argument("--failure-threshold", type=int, default=3,
+                        help="consecutive failures that open a server's circuit breaker")
+    parser.add_argument("--cooldown", type=float, default=30, metavar="SECONDS",
+                        help="how long an open circuit waits before probing the server again")
+    parser.add_argument("--probe-deadline", type=float, default=3, metavar="SECONDS",
+                        help="time allowed for checking all external servers together")
+    parser.add_argument("--dns-ttl", type=float, default=300, metavar="SECONDS",
+                        help="how long resolved server addresses are reused (default: 300)")
+    parser.add_argument("--group-aliases", action="store_true",
+                        help="crawl names that resolve to an address already seen under "
+                             "the first name seen for it")
+    parser.add_argument("--normalize-selectors", choices=["none", "path"], default="none",
+                        help="'path' collapses equivalent path selectors such as /a//b/ "
+                             "and /a/./b (default: none)")
+    parser.add_argument("--bufsize", type=int, default=DEFAULT_BUFSIZE,
+                        help="receive buffer size in bytes")
+    parser.add_argument("--per-server", type=int, default=None,
+                        help="maximum connections in flight to any one server")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="maximum requests per second to any one server")
+    parser.add_argument("--queue-report", type=float, default=None, metavar="SECONDS",
+                        help="periodically print the deepest per-server queues")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="periodically save crawl progress to this sqlite file")
+    parser.add_argument("--checkpoint-interval", type=float, default=30, metavar="SECONDS",
+                        help="seconds between checkpoints (default: 30)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the crawl saved in --checkpoint")
+    parser.add_argument("--records", metavar="PATH",
+                        help="keep per-item size/digest records in this sqlite file")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip unchanged menus and fresh leaves using --records")
+    parser.add_argument("--max-age", type=float, default=None, metavar="SECONDS",
+                        help="re-fetch recorded items older than this in incremental mode")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="serve repeat fetches from a content-addressed cache in DIR")
+    parser.add_argument("--cache-mb", type=float, default=256,
+                        help="cache size limit in megabytes (default: 256)")
+    parser.add_argument("--cache-ttl", type=float, default=None, metavar="SECONDS",
+                        help="treat cached responses older than this as misses")
+    parser.add_argument("--cache-menu-ttl", type=parse_seconds, default=MENU_TTL,
+                        metavar="SECONDS",
+                        help="re-fetch cached menus older than this, or 'none' to reuse them "
+                             f"as long as other responses (default: {MENU_TTL})")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="profile the crawl, writing PREFIX.pstats and a report by "
+                             "phase with the top allocations to PREFIX.txt")
+    parser.add_argument("--metrics", metavar="PREFIX",
+                        help="write fetch timing metrics to PREFIX.json and PREFIX.prom")
+    args = parser.parse_args()
+    if args.engine != "recursive" and (args.max_depth is not None or args.order != "dfs"):
+        parser.error("--max-depth and --order need the recursive engine")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    if args.incremental and not args.records:
+        parser.error("--incremental needs --records")
+    if args.engine == "processes":
+        # Single-process stores and crawl-wide state the shards can't share
+        unsupported = [flag for flag, value in (
+            ("--checkpoint", args.checkpoint), ("--records", args.records),
+            ("--cache", args.cache), ("--max-items", args.max_items),
+            ("--max-bytes", args.max_bytes), ("--max-time", args.max_time),
+            ("--group-aliases", args.group_aliases), ("--profile", args.profile),
+            ("--per-server", args.per_server), ("--rate", args.rate),
+            ("--queue-report", args.queue_report))
+            if value is not None and value is not False]
+        if unsupported:
+            parser.error(f"the processes engine can't be used with {', '.join(unsupported)}")
+
+    crawler = GopherCrawler(args.host, args.port, concurrency=args.concurrency,
+                            timeout=args.timeout, bufsize=args.bufsize,
+                            per_server=args.per_server, rate=args.rate,
+                            queue_report=args.queue_report,
+                            checkpoint=args.checkpoint,
+                            checkpoint_interval=args.checkpoint_interval,
+                            records=args.records, incremental=args.incremental,
+                            max_age=args.max_age, cache=args.cache,
+                            cache_bytes=int(args.cache_mb * 1024 * 1024),
+                            cache_ttl=args.cache_ttl, cache_menu_ttl=args.cache_menu_ttl,
+                            retries=args.retries,
+                            failure_threshold=args.failure_threshold,
+                            cooldown=args.cooldown,
+                            probe_deadline=args.probe_deadline, shards=args.shards,
+                            visited=args.visited, visited_capacity=args.visited_capacity,
+                            visited_error_rate=args.visited_error_rate,
+                            listing=args.listing, results=args.results,
+                            results_format=args.results_format, order=args.order,
+                            max_depth=args.max_depth, max_items=args.max_items,
+                            max_bytes=args.max_bytes, max_time=args.max_time,
+                            max_item_bytes=args.max_item_bytes,
+                            max_item_time=args.max_item_time, dns_ttl=args.dns_ttl,
+                            group_aliases=args.group_aliases,
+                            selector_mode=args.normalize_selectors, profile=args.profile)
+    try:
+        crawler.crawl(engine=args.engine, resume=args.resume)
+    except KeyboardInterrupt:
+        raise SystemExit(130)
+    if args.metrics:
+        crawler.metrics.write_json(args.metrics + ".json")
+        crawler.metrics.write_prometheus(args.metrics + ".prom")
+        print(f"\nMetrics written to {args.metrics}.json and {args.metrics}.prom")
 
 if __name__ == "__main__":
-    # Example usage:
-    crawler = GopherCrawler("comp3310.ddns.net")  # Try with a public gopher server
-    crawler.crawl()
\ No newline at end of file
+    main()